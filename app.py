@@ -1,3 +1,5 @@
+import logging
+
 import streamlit as st
 from core.github_api import GitHubAPI
 from core.config import (
@@ -5,8 +7,19 @@ from core.config import (
     PAGE_ICON,
     PAGE_LAYOUT,
     ERROR_MESSAGES,
+    LOG_LEVEL,
+)
+from core.output import SpillBuffer
+from ui.layout import (
+    render_ui,
+    render_sidebar,
+    render_stitch_output,
+    render_trace,
+)
+
+logging.basicConfig(
+    level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
 )
-from ui.layout import render_ui, render_sidebar
 
 # Set page config
 st.set_page_config(
@@ -57,7 +70,8 @@ def main():
         ]
 
         with st.spinner("Fetching and stitching content..."):
-            all_content, error_occurred = github_api.process_content(
+            rate_limits_before = github_api.rate_limit_stats()
+            stitch = github_api.process_content(
                 inputs,
                 file_patterns,
                 file_filter_mode == "Include matching files",
@@ -65,22 +79,48 @@ def main():
                 line_filter_mode == "Include matching lines",
             )
 
-            if error_occurred:
-                st.warning(
+            # Replace the download buffer of any previous stitch
+            previous_buffer = st.session_state.pop("stitch_buffer", None)
+            if previous_buffer is not None:
+                previous_buffer.close()
+            buffer = SpillBuffer()
+            st.session_state["stitch_buffer"] = buffer
+
+            status = st.empty()
+            st.subheader("Stitched Content:")
+            render_stitch_output(stitch, buffer)
+
+            if stitch.error_occurred:
+                status.warning(
                     "⚠️ Some errors occurred while fetching content. Please check the output below."
                 )
             else:
-                st.success("✅ Content stitched successfully!")
+                status.success("✅ Content stitched successfully!")
 
-            st.subheader("Stitched Content:")
-            st.code(all_content, language="text")
+            rate_limits = github_api.rate_limit_stats()
+            throttled = (
+                rate_limits["throttled"] - rate_limits_before["throttled"]
+            )
+            waited = (
+                rate_limits["total_wait_seconds"]
+                - rate_limits_before["total_wait_seconds"]
+            )
+            if throttled or waited >= 1:
+                st.caption(
+                    f"⏳ Rate limited: {throttled} throttled responses, "
+                    f"{waited:.1f}s spent queued, peak queue depth "
+                    f"{rate_limits['max_queue_depth']}, concurrency now "
+                    f"{rate_limits['concurrency']}"
+                )
 
             st.download_button(
                 "💾 Download Stitched Content",
-                all_content,
+                buffer.open,
                 "stitched_content.md",
                 help="Click to download the stitched content as a markdown file",
+                on_click="ignore",
             )
+            render_trace(stitch.trace)
 
     render_sidebar()
 
@@ -0,0 +1,525 @@
+import base64
+import gzip
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+import urllib.parse
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+TIMESTAMP = "2024-01-01T00:00:00Z"
+COUNTERS_PATH = "/_bench/counters"  # Read-and-reset, never counted itself
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+@dataclass
+class FakeRepo:
+    """A repository with one branch and one commit."""
+
+    name: str
+    files: Dict[str, bytes]
+    default_branch: str = "main"
+    objects: Dict[str, tuple] = field(default_factory=dict)
+    commit_sha: str = ""
+    tree_sha: str = ""
+
+    def __post_init__(self):
+        self.tree_sha = self._build_tree(self.files)
+        self.commit_sha = _sha1(f"commit {self.tree_sha}".encode())
+
+    def walk(self, tree_sha: str, prefix: str = "", recursive=True) -> list:
+        """List a tree the way ``git/trees`` does."""
+        entries = []
+        for name, entry_type, sha, size in self.objects[tree_sha][1]:
+            entry = {
+                "path": prefix + name,
+                "mode": "100644" if entry_type == "blob" else "040000",
+                "type": entry_type,
+                "sha": sha,
+                "url": "",
+            }
+            if size is not None:
+                entry["size"] = size
+            entries.append(entry)
+            if entry_type == "tree" and recursive:
+                entries.extend(self.walk(sha, f"{prefix}{name}/"))
+        return entries
+
+    def _build_tree(self, files: Dict[str, bytes]) -> str:
+        children = {}
+        for path, content in files.items():
+            head, _, rest = path.partition("/")
+            if rest:
+                children.setdefault(head, {})[rest] = content
+            else:
+                children[head] = content
+        entries = []
+        for name in sorted(children):
+            child = children[name]
+            if isinstance(child, dict):
+                entries.append((name, "tree", self._build_tree(child), None))
+            else:
+                sha = _sha1(b"blob " + child)
+                self.objects[sha] = ("blob", child)
+                entries.append((name, "blob", sha, len(child)))
+        sha = _sha1(json.dumps(entries).encode())
+        self.objects[sha] = ("tree", entries)
+        return sha
+
+
+@dataclass
+class FakeIssue:
+    title: str
+    body: str
+    comments: List[str]
+
+
+@dataclass
+class FakePull:
+    title: str
+    body: str
+    diff: bytes
+    head_sha: str
+
+
+class FakeGitHub:
+    """Local stand-in for the GitHub REST and GraphQL endpoints.
+
+    Serves the repositories, issues and pull requests added to it from a
+    threaded HTTP server, answers conditional requests like GitHub, and
+    counts the requests and bytes exchanged so a benchmark can report
+    them.
+    """
+
+    def __init__(self):
+        self.repos: Dict[str, FakeRepo] = {}
+        self.issues: Dict[Tuple[str, int], FakeIssue] = {}
+        self.pulls: Dict[Tuple[str, int], FakePull] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self.counters = _empty_counters()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_repo(self, name: str, files: Dict[str, bytes]) -> FakeRepo:
+        self.repos[name] = FakeRepo(name, files)
+        return self.repos[name]
+
+    def add_issue(self, repo: str, number: int, issue: FakeIssue) -> None:
+        self.issues[repo, number] = issue
+
+    def add_pull(self, repo: str, number: int, pull: FakePull) -> None:
+        self.pulls[repo, number] = pull
+
+    def start(self) -> None:
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, endpoint: str, sent: int, received: int, status: int):
+        with self._lock:
+            counters = self.counters
+            counters["requests"] += 1
+            counters["not_modified"] += status == 304
+            counters["bytes_sent"] += sent
+            counters["bytes_received"] += received
+            by_endpoint = counters["by_endpoint"]
+            by_endpoint[endpoint] = by_endpoint.get(endpoint, 0) + 1
+            if status == 304:
+                not_modified = counters["not_modified_by_endpoint"]
+                not_modified[endpoint] = not_modified.get(endpoint, 0) + 1
+
+    def take_counters(self) -> dict:
+        """Return the counters and start counting from zero again."""
+        with self._lock:
+            counters = self.counters
+            self.counters = _empty_counters()
+        return counters
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeGitHub = None  # Set on the per-server subclass
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._sent = 0
+        url = urllib.parse.urlparse(self.path)
+        path = urllib.parse.unquote(url.path)
+        query = urllib.parse.parse_qs(url.query)
+        if path == COUNTERS_PATH:
+            return self._json(None, self.fake.take_counters())
+        if path == "/user/repos":
+            page = int(query.get("page", ["1"])[0])
+            repos = list(self.fake.repos) if page == 1 else []
+            return self._json("user/repos", [self._repo(n) for n in repos])
+        match = re.match(r"^/repos/([^/]+/[^/]+)(/.*)?$", path)
+        repo = self.fake.repos.get(match.group(1)) if match else None
+        if repo is None:
+            return self._json("other", {"message": "Not Found"}, 404)
+        rest = match.group(2) or ""
+        if not rest:
+            return self._json("repos", self._repo(repo.name))
+        for pattern, route in _ROUTES:
+            route_match = re.match(pattern, rest)
+            if route_match:
+                return route(self, repo, query, *route_match.groups())
+        return self._json("other", {"message": "Not Found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._sent = length
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") != "/graphql":
+            return self._json("other", {"message": "Not Found"}, 404)
+        query = request.get("query", "")
+        variables = request.get("variables") or {}
+        if "issueOrPullRequest" in query:
+            data = self._threads(query)
+        elif "issue(number: $number)" in query:
+            data = self._issue_thread(variables)
+        else:
+            data = self._blobs(query, variables)
+        self._json("graphql", {"data": data})
+
+    # REST routes
+
+    def _commit(self, repo: FakeRepo, query, ref: str):
+        if ref not in (repo.default_branch, repo.commit_sha):
+            return self._json("commits", {"message": "No commit"}, 422)
+        url = f"{self._base()}/repos/{repo.name}"
+        self._json(
+            "commits",
+            {
+                "sha": repo.commit_sha,
+                "url": f"{url}/commits/{repo.commit_sha}",
+                "commit": {
+                    "tree": {
+                        "sha": repo.tree_sha,
+                        "url": f"{url}/git/trees/{repo.tree_sha}",
+                    }
+                },
+            },
+        )
+
+    def _tree(self, repo: FakeRepo, query, sha: str):
+        if sha not in repo.objects:
+            return self._json("trees", {"message": "Not Found"}, 404)
+        recursive = query.get("recursive") == ["1"]
+        tree = repo.walk(sha, recursive=recursive)
+        self._json("trees", {"sha": sha, "tree": tree, "truncated": False})
+
+    def _blob(self, repo: FakeRepo, query, sha: str):
+        obj = repo.objects.get(sha)
+        if obj is None or obj[0] != "blob":
+            return self._json("blobs", {"message": "Not Found"}, 404)
+        data = obj[1]
+        if "raw" in self.headers.get("Accept", ""):
+            return self._send("blobs", data, "application/vnd.github.raw")
+        self._json(
+            "blobs",
+            {
+                "sha": sha,
+                "size": len(data),
+                "encoding": "base64",
+                "content": base64.b64encode(data).decode(),
+            },
+        )
+
+    def _contents(self, repo: FakeRepo, query, path: str):
+        data = repo.files.get(path)
+        if data is None:
+            return self._json("contents", {"message": "Not Found"}, 404)
+        byte_range = re.match(
+            r"bytes=(\d+)-(\d+)", self.headers.get("Range", "")
+        )
+        if byte_range:
+            start, end = map(int, byte_range.groups())
+            return self._send(
+                "contents", data[start : end + 1], "text/plain", 206
+            )
+        self._send("contents", data, "application/vnd.github.raw")
+
+    def _tarball(self, repo: FakeRepo, query, ref: str):
+        buffer = io.BytesIO()
+        prefix = f"{repo.name.replace('/', '-')}-{repo.commit_sha[:7]}"
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for path, data in sorted(repo.files.items()):
+                info = tarfile.TarInfo(f"{prefix}/{path}")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        body = gzip.compress(buffer.getvalue(), compresslevel=1)
+        self._send("tarball", body, "application/x-gzip")
+
+    def _pull(self, repo: FakeRepo, query, number: str):
+        pull = self.fake.pulls.get((repo.name, int(number)))
+        if pull is None:
+            return self._json("pulls", {"message": "Not Found"}, 404)
+        if "diff" in self.headers.get("Accept", ""):
+            media_type = "application/vnd.github.diff; charset=utf-8"
+            return self._send("pulls", pull.diff, media_type)
+        self._json(
+            "pulls",
+            {
+                "number": int(number),
+                "title": pull.title,
+                "body": pull.body,
+                "user": {"login": "octocat"},
+                "state": "open",
+                "created_at": TIMESTAMP,
+                "updated_at": TIMESTAMP,
+                "base": {"ref": repo.default_branch},
+                "head": {"ref": "feature", "sha": pull.head_sha},
+                "url": f"{self._base()}/repos/{repo.name}/pulls/{number}",
+            },
+        )
+
+    def _issue(self, repo: FakeRepo, query, number: str):
+        issue = self.fake.issues.get((repo.name, int(number)))
+        if issue is None:
+            return self._json("issues", {"message": "Not Found"}, 404)
+        self._json(
+            "issues",
+            {
+                "number": int(number),
+                "title": issue.title,
+                "body": issue.body,
+                "user": {"login": "octocat"},
+                "state": "open",
+                "created_at": TIMESTAMP,
+                "updated_at": TIMESTAMP,
+                "comments": len(issue.comments),
+                "url": f"{self._base()}/repos/{repo.name}/issues/{number}",
+            },
+        )
+
+    def _issue_comments(self, repo: FakeRepo, query, number: str):
+        issue = self.fake.issues.get((repo.name, int(number)))
+        if issue is None:
+            return self._json("comments", {"message": "Not Found"}, 404)
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["30"])[0])
+        start = (page - 1) * per_page
+        comments = [
+            {
+                "id": start + index,
+                "body": body,
+                "user": {"login": "octocat"},
+                "created_at": TIMESTAMP,
+            }
+            for index, body in enumerate(
+                issue.comments[start : start + per_page]
+            )
+        ]
+        headers = {}
+        if start + per_page < len(issue.comments):
+            url = f"{self._base()}{urllib.parse.urlparse(self.path).path}"
+            headers["Link"] = (
+                f'<{url}?per_page={per_page}&page={page + 1}>; rel="next"'
+            )
+        self._json("comments", comments, headers=headers)
+
+    # GraphQL
+
+    def _blobs(self, query: str, variables: dict) -> dict:
+        repo = self.fake.repos.get(
+            f"{variables.get('owner')}/{variables.get('name')}"
+        )
+        if repo is None:
+            return {"repository": None}
+        blobs = {}
+        for alias, sha in re.findall(r'(\w+): object\(oid: "(\w+)"\)', query):
+            obj = repo.objects.get(sha)
+            if obj is None or obj[0] != "blob":
+                blobs[alias] = None
+                continue
+            data = obj[1]
+            binary = b"\0" in data
+            blobs[alias] = {
+                "byteSize": len(data),
+                "isBinary": binary,
+                "isTruncated": False,
+                "text": None if binary else data.decode("utf-8", "replace"),
+            }
+        return {"repository": blobs}
+
+    def _threads(self, query: str) -> dict:
+        page_size = int(re.search(r"comments\(first: (\d+)\)", query)[1])
+        data = {}
+        repositories = list(
+            re.finditer(
+                r'(\w+): repository\(owner: "([^"]*)", name: "([^"]*)"\)',
+                query,
+            )
+        )
+        for position, match in enumerate(repositories):
+            end = (
+                repositories[position + 1].start()
+                if position + 1 < len(repositories)
+                else len(query)
+            )
+            repo_name = f"{match[2]}/{match[3]}"
+            threads = {}
+            for alias, number in re.findall(
+                r"(\w+): issueOrPullRequest\(number: (\d+)\)",
+                query[match.end() : end],
+            ):
+                threads[alias] = self._thread(
+                    repo_name, int(number), page_size
+                )
+            data[match[1]] = threads if repo_name in self.fake.repos else None
+        return data
+
+    def _thread(self, repo: str, number: int, page_size: int) -> dict:
+        fields = {
+            "author": {"login": "octocat"},
+            "createdAt": TIMESTAMP,
+            "updatedAt": TIMESTAMP,
+            "state": "OPEN",
+        }
+        pull = self.fake.pulls.get((repo, number))
+        if pull is not None:
+            return dict(
+                fields,
+                __typename="PullRequest",
+                title=pull.title,
+                body=pull.body,
+                baseRefName="main",
+                headRefName="feature",
+                headRefOid=pull.head_sha,
+            )
+        issue = self.fake.issues.get((repo, number))
+        if issue is None:
+            return None
+        return dict(
+            fields,
+            __typename="Issue",
+            title=issue.title,
+            body=issue.body,
+            comments=_comment_page(issue, page_size, None),
+        )
+
+    def _issue_thread(self, variables: dict) -> dict:
+        repo = f"{variables['owner']}/{variables['name']}"
+        issue = self.fake.issues.get((repo, variables["number"]))
+        if issue is None:
+            return {"repository": {"issue": None}}
+        thread = {
+            "title": issue.title,
+            "author": {"login": "octocat"},
+            "createdAt": TIMESTAMP,
+            "state": "OPEN",
+            "body": issue.body,
+            "comments": _comment_page(
+                issue, variables["first"], variables.get("after")
+            ),
+        }
+        return {"repository": {"issue": thread}}
+
+    # Responses
+
+    def _repo(self, name: str) -> dict:
+        owner, short_name = name.split("/")
+        return {
+            "full_name": name,
+            "name": short_name,
+            "owner": {"login": owner},
+            "default_branch": self.fake.repos[name].default_branch,
+            "url": f"{self._base()}/repos/{name}",
+            "fork": False,
+            "archived": False,
+            "size": 1,
+            "pushed_at": TIMESTAMP,
+            "language": "Python",
+        }
+
+    def _base(self) -> str:
+        return f"http://{self.headers['Host']}"
+
+    def _json(self, endpoint, obj, status=200, headers=None):
+        body = json.dumps(obj).encode()
+        self._send(endpoint, body, "application/json", status, headers)
+
+    def _send(
+        self,
+        endpoint: str,
+        body: bytes,
+        content_type: str,
+        status: int = 200,
+        headers: Optional[dict] = None,
+    ):
+        etag = f'"{_sha1(body)}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if endpoint is not None:
+            self.fake.count(endpoint, self._sent, len(body), status)
+
+
+def _empty_counters() -> dict:
+    return {
+        "requests": 0,
+        "not_modified": 0,
+        "bytes_sent": 0,  # Request bodies, client to server
+        "bytes_received": 0,  # Response bodies, server to client
+        "by_endpoint": {},
+        "not_modified_by_endpoint": {},
+    }
+
+
+def _comment_page(issue: FakeIssue, first: int, after: Optional[str]):
+    start = int(after) if after else 0
+    end = start + first
+    return {
+        "pageInfo": {
+            "hasNextPage": end < len(issue.comments),
+            "endCursor": str(end),
+        },
+        "nodes": [
+            {
+                "author": {"login": "octocat"},
+                "createdAt": TIMESTAMP,
+                "body": body,
+            }
+            for body in issue.comments[start:end]
+        ],
+    }
+
+
+_ROUTES = [
+    (r"^/commits/(.+)$", _Handler._commit),
+    (r"^/git/trees/(\w+)$", _Handler._tree),
+    (r"^/git/blobs/(\w+)$", _Handler._blob),
+    (r"^/contents/(.+)$", _Handler._contents),
+    (r"^/tarball/(.+)$", _Handler._tarball),
+    (r"^/pulls/(\d+)$", _Handler._pull),
+    (r"^/issues/(\d+)$", _Handler._issue),
+    (r"^/issues/(\d+)/comments$", _Handler._issue_comments),
+]
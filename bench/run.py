@@ -0,0 +1,238 @@
+"""Benchmark stitches against a local fake GitHub.
+
+Usage::
+
+    python -m bench.run [--scenarios repo,pr] [--files 1000] [--runs 3]
+                        [--output bench.json] [--check]
+
+Each scenario runs in a fresh process with empty on-disk caches, so the
+first run is cold and later runs show what the caches save. The report
+is JSON: per scenario and run, the wall time, HTTP requests and bytes the
+server saw, and the peak RSS of the stitching process.
+
+Scenarios in ``REVALIDATED`` also stitch once more with an empty result
+cache, as after a restart, and record whether every request to the
+listed endpoints was answered 304 Not Modified. ``--check`` exits with an
+error when one was not.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+from .fake_github import COUNTERS_PATH, FakeGitHub
+from .synthetic import make_issue, make_pull, make_repo_files
+
+REPO = "bench/repo"
+TOKEN = "bench-token"
+SCHEMA_VERSION = 1
+
+# One input list per processor type; "file" reads through RepoProcessor
+SCENARIOS = {
+    "repo": [f"https://github.com/{REPO}"],
+    "file": [f"https://github.com/{REPO}/blob/main/README.md"],
+    "regex": [r"regex:.*module_\d*7\.py$"],
+    "pr": [f"https://github.com/{REPO}/pull/1"],
+    "issue": [f"https://github.com/{REPO}/issues/2"],
+}
+# Endpoints a re-stitch must revalidate instead of downloading again
+REVALIDATED = {
+    "pr": ["pulls"],
+}
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), help="comma-separated"
+    )
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--file-bytes", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=500)
+    parser.add_argument("--comment-bytes", type=int, default=500)
+    parser.add_argument("--pr-files", type=int, default=200)
+    parser.add_argument("--pr-lines", type=int, default=200)
+    parser.add_argument("--output", help="write the report here")
+    parser.add_argument(
+        "--check", action="store_true", help="fail if a revalidation failed"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _run_child(args)
+        return
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fake = FakeGitHub()
+    fake.add_repo(
+        REPO, make_repo_files(args.files, args.depth, args.file_bytes)
+    )
+    fake.add_pull(REPO, 1, make_pull(args.pr_files, args.pr_lines))
+    fake.add_issue(REPO, 2, make_issue(args.comments, args.comment_bytes))
+    fake.start()
+    try:
+        results = {
+            name: _run_scenario(name, fake.url, args.runs)
+            for name in scenarios
+        }
+    finally:
+        fake.stop()
+
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "check", "child", "base_url", "result_file")
+    }
+    report = {
+        "schema": SCHEMA_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failed = [
+        name
+        for name, result in results.items()
+        if result.get("error") or not result.get("revalidated", {}).get(
+            "passed", True
+        )
+    ]
+    if args.check and failed:
+        sys.exit(f"checks failed: {', '.join(failed)}")
+
+
+def _run_scenario(name: str, base_url: str, runs: int) -> Dict:
+    """Run one scenario in a fresh process with its own cache directory."""
+    with tempfile.TemporaryDirectory() as home:
+        result_file = os.path.join(home, "result.json")
+        command = [
+            sys.executable, "-m", "bench.run",
+            "--child", name,
+            "--base-url", base_url,
+            "--result-file", result_file,
+            "--runs", str(runs),
+        ]
+        # Caches live under ~/.cache, so a temporary HOME starts them empty
+        env = dict(os.environ, HOME=home)
+        completed = subprocess.run(
+            command,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        if completed.returncode != 0:
+            message = completed.stderr.decode(errors="replace").strip()
+            return {"error": message.splitlines()[-1] if message else ""}
+        with open(result_file) as f:
+            return json.load(f)
+
+
+def _run_child(args: argparse.Namespace) -> None:
+    from core.github_api import GitHubAPI
+    from core.result_cache import ResultCache
+
+    api = GitHubAPI(TOKEN, base_url=args.base_url)
+    inputs = SCENARIOS[args.child]
+    _take_counters(args.base_url)
+    baseline_rss = _peak_rss_kb()
+    runs = [_run_once(api, inputs, args.base_url) for _ in range(args.runs)]
+    report = {
+        "inputs": inputs,
+        "runs": runs,
+        "baseline_rss_kb": baseline_rss,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+    endpoints = REVALIDATED.get(args.child)
+    if endpoints:
+        restarted = GitHubAPI(
+            TOKEN, base_url=args.base_url, result_cache=ResultCache()
+        )
+        run = _run_once(restarted, inputs, args.base_url)
+        report["revalidated"] = {
+            "run": run,
+            "passed": all(
+                run["requests_by_endpoint"].get(endpoint, 0)
+                == run["not_modified_by_endpoint"].get(endpoint, 0)
+                > 0
+                for endpoint in endpoints
+            ),
+        }
+    with open(args.result_file, "w") as f:
+        json.dump(report, f)
+
+
+def _run_once(api, inputs: List[str], base_url: str) -> Dict:
+    started = time.perf_counter()
+    result = api.process_content(inputs, [], True)
+    output_chars = 0
+    for chunk in result:
+        output_chars += len(chunk)
+    wall_time = time.perf_counter() - started
+    counters = _take_counters(base_url)
+    return {
+        "wall_time_s": round(wall_time, 4),
+        "requests": counters["requests"],
+        "not_modified": counters["not_modified"],
+        "bytes_sent": counters["bytes_sent"],
+        "bytes_received": counters["bytes_received"],
+        "requests_by_endpoint": counters["by_endpoint"],
+        "not_modified_by_endpoint": counters["not_modified_by_endpoint"],
+        "output_chars": output_chars,
+        "error": result.error_occurred,
+    }
+
+
+def _take_counters(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url + COUNTERS_PATH) as response:
+        return json.load(response)
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak // 1024  # Reported in bytes on macOS
+    return peak
+
+
+def _git_commit() -> str:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return completed.stdout.decode().strip()
+
+
+if __name__ == "__main__":
+    main()
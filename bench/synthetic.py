@@ -0,0 +1,72 @@
+import hashlib
+from typing import Dict
+
+from .fake_github import FakeIssue, FakePull
+
+# Files per directory level of a synthetic repository
+FANOUT = 8
+
+
+def make_repo_files(
+    num_files: int, depth: int, file_bytes: int
+) -> Dict[str, bytes]:
+    """Python modules of about ``file_bytes`` each, ``depth`` dirs deep.
+
+    Every tenth file is a binary asset, so classification and skipping
+    are part of the measurement.
+    """
+    files = {"README.md": b"# Benchmark repository\n"}
+    for index in range(num_files):
+        directories = [
+            f"pkg{(index // FANOUT ** level) % FANOUT}"
+            for level in range(depth)
+        ]
+        if index % 10 == 9:
+            path = "/".join(directories + [f"asset_{index}.png"])
+            files[path] = b"\x89PNG\r\n\x1a\n\0" + _filler(index, file_bytes)
+            continue
+        path = "/".join(directories + [f"module_{index}.py"])
+        lines = []
+        size = 0
+        line = 0
+        while size < file_bytes:
+            text = f"def function_{index}_{line}(value):\n    return value\n"
+            lines.append(text)
+            size += len(text)
+            line += 1
+        files[path] = "".join(lines).encode()
+    return files
+
+
+def make_issue(num_comments: int, comment_bytes: int) -> FakeIssue:
+    comments = [
+        f"Comment {index}: " + "lorem ipsum " * (comment_bytes // 12)
+        for index in range(num_comments)
+    ]
+    return FakeIssue("Benchmark issue", "Issue body\n", comments)
+
+
+def make_pull(num_files: int, lines_per_file: int) -> FakePull:
+    """A pull request adding ``num_files`` files of ``lines_per_file``."""
+    parts = []
+    for index in range(num_files):
+        path = f"src/changed_{index}.py"
+        parts.append(
+            f"diff --git a/{path} b/{path}\n"
+            "new file mode 100644\n"
+            "--- /dev/null\n"
+            f"+++ b/{path}\n"
+            f"@@ -0,0 +1,{lines_per_file} @@\n"
+        )
+        parts.extend(
+            f"+value_{index}_{line} = {line}\n"
+            for line in range(lines_per_file)
+        )
+    diff = "".join(parts).encode()
+    head_sha = hashlib.sha1(diff).hexdigest()
+    return FakePull("Benchmark pull request", "PR body\n", diff, head_sha)
+
+
+def _filler(seed: int, size: int) -> bytes:
+    block = hashlib.sha256(str(seed).encode()).digest()
+    return (block * (size // len(block) + 1))[:size]
@@ -0,0 +1,31 @@
+import tarfile
+from typing import Iterator, Set, Tuple
+
+import requests
+
+from .config import ARCHIVE_TIMEOUT
+
+
+def iter_archive(
+    session: requests.Session, url: str, headers: dict, wanted: Set[str]
+) -> Iterator[Tuple[str, bytes]]:
+    """Stream a repository tarball and yield ``(path, data)`` for wanted files.
+
+    The archive is read sequentially from the response, one member at a
+    time, so neither the compressed nor the extracted archive is ever held
+    in memory or written to disk. Member paths are returned relative to the
+    repository root (GitHub prefixes them with an ``owner-repo-sha/`` dir).
+    """
+    with session.get(
+        url, headers=headers, stream=True, timeout=ARCHIVE_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                _, _, path = member.name.partition("/")
+                if path not in wanted:
+                    continue
+                yield path, tar.extractfile(member).read()
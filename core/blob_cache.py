@@ -0,0 +1,129 @@
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .config import BLOB_CACHE_DIR, BLOB_CACHE_ENABLED, BLOB_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class BlobCache:
+    """Persistent cache of decoded file contents keyed by git blob SHA.
+
+    Blob SHAs are content addresses, so an entry can never go stale and is
+    served without revalidation. The cache is capped at ``max_bytes`` on
+    disk and evicts the least recently used blobs first.
+    """
+
+    def __init__(
+        self,
+        directory: str = BLOB_CACHE_DIR,
+        max_bytes: int = BLOB_CACHE_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # sha -> size on disk, oldest first
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def __contains__(self, sha: str) -> bool:
+        with self._lock:
+            return sha in self._entries
+
+    def get(self, sha: str) -> Optional[str]:
+        """Return the cached text for ``sha``, or None on a miss."""
+        path = self._path(sha)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+
+        with self._lock:
+            if sha in self._entries:
+                self._entries.move_to_end(sha)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, sha: str, text: str) -> None:
+        """Store the decoded text for ``sha`` and evict old entries if needed."""
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".tmp-", dir=os.path.dirname(path)
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(sha, 0)
+            self._entries[sha] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            sha, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(sha))
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from file modification times."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("."):
+                    continue  # Unfinished write
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+
+        for _, sha, size in sorted(found):
+            self._entries[sha] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], sha)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_blob_cache() -> Optional[BlobCache]:
+    """Return the process-wide blob cache, or None when caching is disabled."""
+    global _default_cache
+    if not BLOB_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = BlobCache()
+            except OSError as e:
+                logger.warning("Blob cache disabled: %s", e)
+                return None
+        return _default_cache
@@ -0,0 +1,200 @@
+import math
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from .config import (
+    CHARS_PER_TOKEN,
+    OUTPUT_BUDGET,
+    OUTPUT_BUDGET_UNIT,
+    OUTPUT_FILE_BUDGET,
+    OUTPUT_PRIORITY_PATTERNS,
+)
+
+UNITS = ("bytes", "lines", "tokens")
+_FOOTER_MAX_PATHS = 50  # Omitted files listed per input
+
+
+class FileSection(str):
+    """Output chunk belonging to one file, tagged with the file's path.
+
+    ``is_error`` marks a chunk reporting that the file failed.
+    """
+
+    def __new__(cls, text: str, path: str, is_error: bool = False):
+        section = super().__new__(cls, text)
+        section.path = path
+        section.is_error = is_error
+        return section
+
+
+class ErrorText(str):
+    """Output chunk reporting a failure, such as a fetch that failed."""
+
+    is_error = True
+
+
+def is_error(chunk: str) -> bool:
+    """Whether an output chunk reports a failure."""
+    return getattr(chunk, "is_error", False)
+
+
+class FileList(str):
+    """Empty chunk announcing the files an input emits next, in order."""
+
+    def __new__(cls, paths: List[str]):
+        announcement = super().__new__(cls, "")
+        announcement.paths = paths
+        return announcement
+
+
+class OutputBudget:
+    """Caps on the size of a stitch, in bytes, lines or approximate tokens.
+
+    ``limit`` caps the whole stitch and ``file_limit`` the content of each
+    file; either may be None. Files whose path matches an earlier pattern
+    of ``priority_patterns`` are emitted first, so the budget is spent on
+    them. The budget is charged in output order; once it is used up the
+    stitch stops, pending fetches are cancelled and a footer lists what
+    was left out.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = OUTPUT_BUDGET,
+        file_limit: Optional[int] = OUTPUT_FILE_BUDGET,
+        unit: str = OUTPUT_BUDGET_UNIT,
+        priority_patterns: Optional[List[str]] = None,
+    ):
+        if unit not in UNITS:
+            raise ValueError(f"unknown budget unit '{unit}'")
+        if priority_patterns is None:
+            priority_patterns = OUTPUT_PRIORITY_PATTERNS
+        self.limit = limit
+        self.file_limit = file_limit
+        self.unit = unit
+        self.priority_patterns = list(priority_patterns)
+        self._priority = [re.compile(p) for p in self.priority_patterns]
+        self.used = 0
+        self.exhausted = False
+
+    @property
+    def cache_key(self) -> tuple:
+        """What the output of a single input depends on."""
+        return self.file_limit, self.unit, tuple(self.priority_patterns)
+
+    def measure(self, text: str) -> int:
+        if self.unit == "bytes":
+            return len(text.encode("utf-8"))
+        if self.unit == "lines":
+            return text.count("\n")
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def remaining_bytes(self) -> Optional[int]:
+        """Rough number of content bytes the budget still has room for.
+
+        None without an overall limit, or when it counts lines, which say
+        nothing about bytes.
+        """
+        if self.limit is None or self.unit == "lines":
+            return None
+        left = max(self.limit - self.used, 0)
+        return left if self.unit == "bytes" else left * CHARS_PER_TOKEN
+
+    def sort_key(self, path: str) -> Tuple[int, str]:
+        """Order files by the first priority pattern they match, then path."""
+        for rank, pattern in enumerate(self._priority):
+            if pattern.search(path):
+                return rank, path
+        return len(self._priority), path
+
+    def cap_file(self, text: str) -> str:
+        """Cut the content of one file to ``file_limit``."""
+        if self.file_limit is None:
+            return text
+        if self.measure(text) <= self.file_limit:
+            return text
+        return self._cut(text, self.file_limit) + self._note()
+
+    def cap_blocks(self, blocks: Iterator[str]) -> Iterator[str]:
+        """Cut streamed content to ``file_limit``, then stop reading it."""
+        if self.file_limit is None:
+            yield from blocks
+            return
+        used = 0
+        try:
+            for block in blocks:
+                size = self.measure(block)
+                if used + size > self.file_limit:
+                    yield self._cut(block, self.file_limit - used)
+                    yield self._note()
+                    return
+                used += size
+                yield block
+        finally:
+            blocks.close()
+
+    def take(self, chunk: str) -> str:
+        """Charge an output chunk, cutting it if it overruns ``limit``."""
+        if self.limit is None:
+            return chunk
+        size = self.measure(chunk)
+        if self.used + size <= self.limit:
+            self.used += size
+            return chunk
+        text = self._cut(chunk, self.limit - self.used)
+        self.used = self.limit
+        self.exhausted = True
+        return text
+
+    def footer(self, omitted: List[Tuple[str, Optional[List[str]]]]) -> str:
+        """Describe the inputs and files left out of a stitch.
+
+        ``omitted`` pairs each input line with the paths of the files it
+        did not emit; an empty list means the whole input was left out and
+        None that it was cut short.
+        """
+        lines = [
+            f"\n\n--- Output budget of {self.limit} {self.unit} reached; "
+            "omitted: ---\n"
+        ]
+        for input_line, paths in omitted:
+            if paths is None:
+                lines.append(f"- {input_line} (cut short)\n")
+                continue
+            if not paths:
+                lines.append(f"- {input_line}\n")
+                continue
+            shown = ", ".join(paths[:_FOOTER_MAX_PATHS])
+            more = len(paths) - _FOOTER_MAX_PATHS
+            if more > 0:
+                shown += f" and {more} more"
+            lines.append(f"- {input_line}: {shown}\n")
+        return "".join(lines)
+
+    def _cut(self, text: str, size: int) -> str:
+        size = max(size, 0)
+        if self.unit == "bytes":
+            data = text.encode("utf-8")[:size]
+            return data.decode("utf-8", errors="ignore")
+        if self.unit == "lines":
+            end = -1
+            for _ in range(size):
+                end = text.find("\n", end + 1)
+                if end == -1:
+                    return text
+            return text[: end + 1]
+        return text[: size * CHARS_PER_TOKEN]
+
+    def _note(self) -> str:
+        return f"\n[Truncated after {self.file_limit} {self.unit}]\n"
+
+
+def make_budget() -> Optional[OutputBudget]:
+    """Return a budget for one stitch from the configuration, if any."""
+    if (
+        OUTPUT_BUDGET is None
+        and OUTPUT_FILE_BUDGET is None
+        and not OUTPUT_PRIORITY_PATTERNS
+    ):
+        return None
+    return OutputBudget()
@@ -0,0 +1,124 @@
+import codecs
+import posixpath
+from typing import Optional, Tuple
+
+import requests
+
+from .config import (
+    BINARY_FILE_EXTENSIONS,
+    GENERATED_FILE_NAMES,
+    GENERATED_FILE_SUFFIXES,
+    GITHUB_MAX_FILE_SIZE,
+    SKIP_GENERATED_FILES,
+    SNIFF_BYTES,
+)
+
+# Classification of a manifest entry before anything is fetched
+TEXT = "text"
+BINARY = "binary"
+GENERATED = "generated"
+LARGE = "large"  # Over GITHUB_MAX_FILE_SIZE; streamed or skipped
+UNKNOWN = "unknown"  # Only the content can tell
+
+TEXT_EXTENSIONS = {
+    # Source code
+    "py", "pyi", "pyx", "pxd", "js", "mjs", "cjs", "jsx", "ts", "tsx",
+    "mts", "cts", "java", "kt", "kts", "scala", "sc", "groovy", "gradle",
+    "c", "h", "cc", "cpp", "cxx", "hh", "hpp", "hxx", "inl", "m", "mm",
+    "cs", "fs", "fsx", "vb", "go", "rs", "swift", "rb", "erb", "php",
+    "pl", "pm", "t", "lua", "r", "jl", "dart", "ex", "exs", "erl", "hrl",
+    "hs", "lhs", "elm", "clj", "cljs", "cljc", "edn", "ml", "mli", "nim",
+    "zig", "v", "sv", "vhd", "vhdl", "sol", "move", "cairo", "asm", "s",
+    "f", "f90", "f95", "for", "pas", "ada", "adb", "ads", "d", "cr",
+    "vue", "svelte", "astro", "coffee", "purs", "rkt", "scm",
+    "lisp", "el", "tcl", "awk", "sed", "vim", "ps1", "psm1", "bat", "cmd",
+    "sh", "bash", "zsh", "fish", "ksh",
+    # Markup, styles and templates
+    "md", "markdown", "mdx", "rst", "txt", "text", "adoc", "asciidoc",
+    "org", "tex", "bib", "html", "htm", "xhtml", "xml", "xsl", "xslt",
+    "svg", "css", "scss", "sass", "less", "styl", "hbs", "mustache",
+    "j2", "jinja", "jinja2", "njk", "liquid", "twig", "haml", "slim",
+    "pug", "ejs", "ipynb",
+    # Data and configuration
+    "json", "jsonc", "json5", "jsonl", "ndjson", "yaml", "yml", "toml",
+    "ini", "cfg", "conf", "config", "properties", "env", "csv", "tsv",
+    "sql", "graphql", "gql", "proto", "thrift", "avsc", "prisma", "tf",
+    "tfvars", "hcl", "nix", "dhall", "cue", "rego", "lock", "mod", "sum",
+    "editorconfig", "gitignore", "gitattributes", "dockerignore",
+    "npmrc", "nvmrc", "babelrc", "eslintrc", "prettierrc", "pylintrc",
+    "flake8", "coveragerc", "cmake", "mk", "mak", "bazel", "bzl",
+    "diff", "patch", "log",
+}
+
+TEXT_FILE_NAMES = {
+    "makefile", "gnumakefile", "dockerfile", "containerfile", "vagrantfile",
+    "jenkinsfile", "procfile", "gemfile", "rakefile", "podfile", "brewfile",
+    "pipfile", "justfile", "license", "licence", "copying", "notice",
+    "authors", "contributors", "changelog", "changes", "readme", "todo",
+    "codeowners", "build", "workspace", "manifest",
+}
+
+
+def classify_path(
+    path: str, size: int, skip_generated: bool = SKIP_GENERATED_FILES
+) -> Tuple[str, Optional[str]]:
+    """Classify a manifest entry from its path and size alone.
+
+    Returns ``(kind, category)``: ``category`` names the
+    ``BINARY_FILE_EXTENSIONS`` group of binary files and is None
+    otherwise. Files whose name says nothing either way are ``UNKNOWN``.
+    Without ``skip_generated``, generated files are classified like any
+    other file.
+    """
+    name = posixpath.basename(path)
+    lower_name = name.lower()
+    if skip_generated and (
+        name in GENERATED_FILE_NAMES
+        or lower_name.endswith(tuple(GENERATED_FILE_SUFFIXES))
+    ):
+        return GENERATED, None
+
+    extension = lower_name.rsplit(".", 1)[-1] if "." in lower_name else ""
+    for category, extensions in BINARY_FILE_EXTENSIONS.items():
+        if extension in extensions:
+            return BINARY, category
+
+    if size > GITHUB_MAX_FILE_SIZE:
+        return LARGE, None
+    if extension in TEXT_EXTENSIONS or lower_name in TEXT_FILE_NAMES:
+        return TEXT, None
+    if lower_name.split(".", 1)[0] in TEXT_FILE_NAMES:
+        return TEXT, None  # README.ja, Dockerfile.dev and the like
+    return UNKNOWN, None
+
+
+def looks_binary(sample: bytes) -> bool:
+    """Tell binary content from text by its first bytes.
+
+    Like git, a NUL byte means binary; so does a sample that is not valid
+    UTF-8 (a multi-byte sequence cut at the end of the sample is fine).
+    """
+    if b"\0" in sample:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def sniff(
+    session: requests.Session,
+    url: str,
+    headers: dict,
+    num_bytes: int = SNIFF_BYTES,
+) -> bytes:
+    """Read the first ``num_bytes`` of a raw file with a ranged request.
+
+    The response is streamed, so at most ``num_bytes`` are read even when
+    the server ignores the ``Range`` header.
+    """
+    headers = {**headers, "Range": f"bytes=0-{num_bytes - 1}"}
+    with session.get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        return response.raw.read(num_bytes, decode_content=True)
@@ -1,9 +1,138 @@
+import os
+
 # GitHub configuration
+GITHUB_API_URL = "https://api.github.com"  # REST root; GraphQL at /graphql
 GITHUB_MAX_FILE_SIZE = 1000000  # 1MB
 BINARY_FILE_EXTENSIONS = {
-    "images": ["png", "jpg", "jpeg", "gif", "bmp"],
-    "documents": ["pdf", "doc", "docx", "xls", "xlsx"],
+    "images": [
+        "png", "jpg", "jpeg", "gif", "bmp", "ico", "icns", "webp", "tif",
+        "tiff", "psd", "heic", "avif", "xcf",
+    ],
+    "documents": [
+        "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "odt", "ods",
+        "odp", "epub",
+    ],
+    "fonts": ["ttf", "otf", "woff", "woff2", "eot"],
+    "archives": [
+        "zip", "tar", "gz", "tgz", "bz2", "xz", "7z", "rar", "zst", "lz4",
+        "jar", "war", "whl", "egg", "nupkg", "gem", "deb", "rpm", "apk",
+        "dmg", "iso",
+    ],
+    "audio": ["mp3", "wav", "flac", "ogg", "m4a", "aac", "opus", "mid"],
+    "video": ["mp4", "mov", "avi", "mkv", "webm", "wmv", "flv", "m4v"],
+    "executables": [
+        "exe", "dll", "so", "dylib", "a", "lib", "o", "obj", "bin", "wasm",
+        "class", "pyc", "pyo", "pyd", "elc", "beam",
+    ],
+    "data": [
+        "db", "sqlite", "sqlite3", "mdb", "parquet", "feather", "avro",
+        "orc", "npy", "npz", "pkl", "pickle", "h5", "hdf5", "pt", "pth",
+        "onnx", "tflite", "safetensors", "ckpt",
+    ],
 }
+# Generated files skipped like binaries (exact names, then name suffixes)
+SKIP_GENERATED_FILES = True
+GENERATED_FILE_NAMES = [
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml",
+    "bun.lockb", "poetry.lock", "Pipfile.lock", "uv.lock", "pdm.lock",
+    "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum", "mix.lock",
+    "pubspec.lock", "Podfile.lock", "packages.lock.json", "flake.lock",
+]
+GENERATED_FILE_SUFFIXES = [
+    ".min.js", ".min.css", ".min.mjs", ".bundle.js", ".chunk.js", ".js.map",
+    ".css.map",
+]
+SNIFF_MIN_BYTES = 65536  # Unrecognized files this large are sniffed first
+SNIFF_BYTES = 2048  # Bytes read to tell text from binary
+
+# Logging and tracing configuration
+LOG_LEVEL = "WARNING"  # Level of the app's log output; DEBUG shows every file
+TRACE_ENABLED = True  # Record request and input spans for each stitch
+TRACE_MAX_SPANS = 10000  # Spans kept per stitch; totals count all of them
+
+# Fetch configuration
+FETCH_CONCURRENCY = 8  # Parallel blob downloads per directory
+PARALLEL_INPUTS = True  # Process input lines concurrently
+INPUT_CONCURRENCY = 4  # Input lines processed at the same time
+INPUT_TIMEOUT = 300  # Seconds a single input may run before it is abandoned
+PREFETCH_TIMEOUT = 10  # Seconds an input waits for the shared GraphQL prefetch
+SHARED_BLOB_WAIT = 30  # Seconds an input waits for a blob another one fetches
+REQUEST_RETRIES = 3  # Retries for connection-level failures
+SCHEDULER_MAX_CONCURRENCY = 16  # Requests in flight per token
+TRANSPORT_POOL_SIZE = 16  # Keep-alive connections per host, >= in flight
+RATE_LIMIT_MAX_RETRIES = 5  # Re-queues of a rate-limited request
+RATE_LIMIT_MAX_WAIT = 900  # Seconds a request may wait for a limit to reset
+SECONDARY_LIMIT_BACKOFF = 60  # Seconds to pause without a Retry-After header
+GRAPHQL_BLOBS_ENABLED = True  # Fetch small files in batched GraphQL queries
+GRAPHQL_BATCH_MAX_FILES = 50  # Blobs per GraphQL query
+GRAPHQL_BATCH_MAX_BYTES = 1000000  # Blob bytes per GraphQL query (1MB)
+GRAPHQL_MIN_BATCH = 2  # Smaller batches use the REST API
+GRAPHQL_PAGE_SIZE = 100  # Issue comments per GraphQL page (API maximum)
+GRAPHQL_THREADS_PER_QUERY = 20  # Issues and pull requests per GraphQL query
+DIFF_CHUNK_BYTES = 65536  # Read size when streaming pull request diffs
+REGEX_REPO_CONCURRENCY = 4  # Repositories scanned at once by regex: inputs
+REGEX_LOOKAHEAD_CHUNKS = 32  # Chunks a scan runs ahead of the regex output
+ARCHIVE_ENABLED = True  # Stream a tarball for large directory stitches
+ARCHIVE_THRESHOLD_FILES = 200  # Uncached files needed to switch to the tarball
+ARCHIVE_MIN_FRACTION = 0.25  # ...and their share of the repository's size
+ARCHIVE_BUFFER_BYTES = 8 * 1024 * 1024  # Members held for later, no blob cache
+ARCHIVE_TIMEOUT = 60  # Seconds to wait for the next chunk of the tarball
+
+# Large file configuration
+LARGE_FILES_ENABLED = True  # Stream files over GITHUB_MAX_FILE_SIZE
+LARGE_FILE_MAX_BYTES = 50 * 1024 * 1024  # Bytes read per streamed file
+LARGE_FILE_MAX_LINES = None  # Lines read per streamed file
+STREAM_CHUNK_BYTES = 64 * 1024  # Read size when streaming a file
+STREAM_BLOCK_BYTES = 64 * 1024  # Output chunk size of a streamed file
+
+# Output budget configuration
+OUTPUT_BUDGET_UNIT = "tokens"  # "bytes", "lines" or "tokens"
+OUTPUT_BUDGET = None  # Whole stitch, in OUTPUT_BUDGET_UNIT (None: no cap)
+OUTPUT_FILE_BUDGET = None  # Content of each file, in OUTPUT_BUDGET_UNIT
+OUTPUT_PRIORITY_PATTERNS = []  # Path regexes; earlier matches come first
+CHARS_PER_TOKEN = 4  # Rough token size used for the "tokens" unit
+OUTPUT_LOOKAHEAD_CHUNKS = 32  # Chunks an input runs ahead under a budget
+OUTPUT_LOOKAHEAD_UNITS = 1  # Blob batches fetched ahead under a budget
+
+# Regex search configuration
+REGEX_INCLUDE_FORKS = False  # Search forked repositories
+REGEX_INCLUDE_ARCHIVED = False  # Search archived repositories
+REGEX_MAX_REPO_SIZE_KB = None  # Skip larger repositories (GitHub's size, KB)
+REGEX_LANGUAGES = None  # Only repositories with these primary languages
+REGEX_OWNERS = None  # Only repositories of these users or organizations
+REGEX_MAX_MATCHES = None  # Stop after this many matching files
+REGEX_MAX_OUTPUT_BYTES = None  # Stop once the output reaches this size
+
+# Cache configuration
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "github-stitcher")
+BLOB_CACHE_ENABLED = True
+BLOB_CACHE_DIR = os.path.join(CACHE_DIR, "blobs")
+BLOB_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+HTTP_CACHE_ENABLED = True  # Conditional requests (ETag / Last-Modified)
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, "http")
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+HTTP_CACHE_MAX_STREAM_BYTES = 16 * 1024 * 1024  # Larger streams not cached
+INCREMENTAL_ENABLED = True  # Reuse the manifest of the previous stitch
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+PATH_INDEX_ENABLED = True  # Answer regex: searches from a local path index
+PATH_INDEX_PATH = os.path.join(CACHE_DIR, "paths.sqlite3")
+RESULT_CACHE_ENABLED = True  # Replay identical inputs at the same version
+RESULT_CACHE_TTL = 3600  # Seconds a memoized input section is replayed
+RESULT_CACHE_MAX_CHARS = 128 * 1024 * 1024  # In memory, shared by sessions
+
+# Local mirror configuration
+DEFAULT_REPO_BACKEND = "api"  # "api" (REST and GraphQL) or "mirror"
+REPO_BACKENDS = {}  # "owner/repo" -> backend, overriding the default
+MIRROR_DIR = os.path.join(CACHE_DIR, "mirrors")  # Blobless bare clones
+MIRROR_REMOTE_URL = "https://github.com/{repo}.git"
+MIRROR_REMOTES = {}  # "owner/repo" -> any git URL, file:// included
+MIRROR_FETCH_INTERVAL = 60  # Seconds a mirror is used before fetching again
+MIRROR_GIT_TIMEOUT = 600  # Seconds a git command may run
+
+# Output configuration
+SPILL_THRESHOLD_BYTES = 8 * 1024 * 1024  # Download buffer moves to disk above this
+DISPLAY_MAX_BYTES = 5 * 1024 * 1024  # Preview stops rendering after this
+DISPLAY_BLOCK_BYTES = 64 * 1024  # Size of each progressively rendered block
 
 # UI configuration
 PAGE_TITLE = "GitHub Stitcher"
@@ -16,4 +145,5 @@ ERROR_MESSAGES = {
     "not_found": "Repository, path, PR, or issue not found. Please check the URL and ensure you have access.",
     "too_large": lambda size: f"File is too large to display (size: {size} bytes)",
     "binary_file": lambda path, type: f"[Binary {type} file: {path}]",
+    "timeout": lambda seconds: f"\nError: Timed out after {seconds} seconds.\n",
 }
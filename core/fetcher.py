@@ -0,0 +1,51 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from .config import FETCH_CONCURRENCY
+from .tracing import bind
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def fetch_ordered(
+    fetch: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = FETCH_CONCURRENCY,
+    lookahead: Optional[int] = None,
+) -> Iterator[Tuple[T, Optional[R], Optional[Exception]]]:
+    """Run ``fetch`` over ``items`` on a bounded thread pool.
+
+    Results are yielded in the order of ``items`` as ``(item, result, error)``
+    tuples. An exception raised for one item is returned as its ``error`` and
+    never affects the other items. Items are submitted lazily, at most
+    ``lookahead`` (by default twice ``max_workers``) ahead of the consumer,
+    and closing the iterator early cancels the items that have not started.
+    """
+    items = iter(items)
+    max_workers = max(1, max_workers)
+    if lookahead is None:
+        lookahead = 2 * max_workers
+
+    def run(item: T) -> Tuple[Optional[R], Optional[Exception]]:
+        try:
+            return fetch(item), None
+        except Exception as e:
+            return None, e
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for item in islice(items, max(1, lookahead)):
+            pending.append((item, executor.submit(bind(run), item)))
+        while pending:
+            item, future = pending.popleft()
+            for next_item in islice(items, 1):
+                future_next = executor.submit(bind(run), next_item)
+                pending.append((next_item, future_next))
+            result, error = future.result()
+            yield item, result, error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
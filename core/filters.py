@@ -0,0 +1,147 @@
+import re
+from typing import Iterator, List, Optional, Pattern, Tuple
+
+# Backreferences change meaning once patterns share one alternation
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+# Anchors to the whole text, which a single scan of a file cannot honour
+_TEXT_ANCHOR = re.compile(r"\\[AZ]")
+
+
+def compile_patterns(
+    patterns: Optional[List[str]], flags: int = 0
+) -> Optional[Pattern]:
+    """Compile patterns into a single alternation, or None without patterns.
+
+    Patterns that cannot share an alternation (inline global flags,
+    backreferences) are combined with a lookahead per pattern instead.
+    """
+    patterns = [pattern for pattern in patterns or [] if pattern]
+    if not patterns:
+        return None
+
+    compiled = [re.compile(pattern, flags) for pattern in patterns]
+    if len(compiled) == 1:
+        return compiled[0]
+
+    if not any(_BACKREFERENCE.search(pattern) for pattern in patterns):
+        try:
+            return re.compile(
+                "|".join(f"(?:{pattern})" for pattern in patterns), flags
+            )
+        except re.error:
+            pass
+    return _AnyPattern(compiled)
+
+
+class _AnyPattern:
+    """Fallback matcher trying several compiled patterns at each search."""
+
+    def __init__(self, patterns: List[Pattern]):
+        self.patterns = patterns
+
+    def search(self, text: str, pos: int = 0):
+        best = None
+        for pattern in self.patterns:
+            match = pattern.search(text, pos)
+            if match and (best is None or match.start() < best.start()):
+                best = match
+        return best
+
+
+class FilterSet:
+    """File path and line filters compiled once per stitch.
+
+    Path patterns are searched in the file path; line patterns are searched
+    in each line. In both cases a file or line is kept when whether it
+    matches equals the corresponding ``keep_matching_*`` flag.
+    """
+
+    def __init__(
+        self,
+        file_patterns: Optional[List[str]] = None,
+        keep_matching_files: bool = True,
+        line_patterns: Optional[List[str]] = None,
+        keep_matching_lines: bool = True,
+    ):
+        self.file_regex = compile_patterns(file_patterns)
+        self.keep_matching_files = keep_matching_files
+        self.line_regex = compile_patterns(line_patterns, re.MULTILINE)
+        self.keep_matching_lines = keep_matching_lines
+        file_patterns = tuple(p for p in file_patterns or [] if p)
+        line_patterns = tuple(p for p in line_patterns or [] if p)
+        self._per_line = any(_TEXT_ANCHOR.search(p) for p in line_patterns)
+        self._key = (
+            file_patterns,
+            keep_matching_files if file_patterns else None,
+            line_patterns,
+            keep_matching_lines if line_patterns else None,
+        )
+
+    @property
+    def cache_key(self) -> tuple:
+        """Hashable key equal for filter sets that behave the same."""
+        return self._key
+
+    @property
+    def has_line_filter(self) -> bool:
+        return self.line_regex is not None
+
+    def include_path(self, path: str) -> bool:
+        """Return whether a file path passes the path filter."""
+        if self.file_regex is None:
+            return True
+        return bool(self.file_regex.search(path)) == self.keep_matching_files
+
+    def include_line(self, line: str) -> bool:
+        """Return whether a single line passes the line filter."""
+        if self.line_regex is None:
+            return True
+        return bool(self.line_regex.search(line)) == self.keep_matching_lines
+
+    def filter_text(self, text: str) -> str:
+        """Apply the line filter to a whole file in a single scan.
+
+        The combined pattern is searched over the full text and only the
+        lines it hits are sliced out, so non-matching lines are never
+        materialized. The result equals filtering ``text.split("\\n")``
+        line by line and joining with newlines; patterns using ``\\A`` or
+        ``\\Z`` are matched that way, one line at a time.
+        """
+        if self.line_regex is None or not text:
+            return text
+        if self._per_line:
+            return "\n".join(
+                line for line in text.split("\n") if self.include_line(line)
+            )
+
+        spans = self._matching_line_spans(text)
+        if self.keep_matching_lines:
+            return "\n".join(text[start:end] for start, end in spans)
+
+        pieces = []
+        previous_end = 0
+        for start, end in spans:
+            if start > previous_end:
+                pieces.append(text[previous_end : start - 1])
+            previous_end = end + 1
+        if previous_end <= len(text):
+            pieces.append(text[previous_end:])
+        return "\n".join(pieces)
+
+    def _matching_line_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield ``(start, end)`` of every line containing a match."""
+        regex = self.line_regex
+        length = len(text)
+        pos = 0
+        while pos <= length:
+            match = regex.search(text, pos)
+            if match is None:
+                return
+            start = text.rfind("\n", 0, match.start()) + 1
+            end = text.find("\n", match.start())
+            if end == -1:
+                end = length
+            # A match running into the next line does not count for this one
+            if match.end() <= end or regex.search(text[start:end]):
+                yield start, end
+            pos = end + 1
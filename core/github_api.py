@@ -1,26 +1,98 @@
-from typing import List, Tuple, Optional
-from io import StringIO
-from github import Github
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
 from github.GithubException import GithubException
 
+from . import tracing
+from .budget import (
+    FileList,
+    FileSection,
+    OutputBudget,
+    is_error,
+    make_budget,
+)
+from .config import (
+    ERROR_MESSAGES,
+    GITHUB_API_URL,
+    INPUT_CONCURRENCY,
+    INPUT_TIMEOUT,
+    OUTPUT_LOOKAHEAD_CHUNKS,
+    PARALLEL_INPUTS,
+    PREFETCH_TIMEOUT,
+)
+from .filters import FilterSet
+from .graphql import THREAD_TYPES, fetch_threads
+from .output import StitchResult
 from .parsers import parse_github_input
+from .planner import StitchPlan, plan_stitch
+from .processors.base import ContentProcessor
 from .processors.issue import IssueProcessor
 from .processors.pr import PRProcessor
 from .processors.repo import RepoProcessor
 from .processors.regex import RegexProcessor
+from .result_cache import ResultCache, get_default_result_cache
+from .scheduler import get_scheduler
+from .transport import Transport, auth_headers, get_default_transport
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # Marks the end of an input's chunk queue
+
+
+def _thread_key(parsed: tuple) -> Optional[Tuple[str, str, int]]:
+    """Key of a pull request or issue input in prefetched threads."""
+    input_type, repo_name, extra_info = parsed
+    if input_type not in THREAD_TYPES:
+        return None
+    try:
+        return input_type, repo_name, int(extra_info)
+    except ValueError:
+        return None
+
+
+def _prefetched(threads: Future, key: tuple) -> Optional[dict]:
+    """Prefetched thread of an input, or None to let its processor fetch it.
+
+    An input waits at most ``PREFETCH_TIMEOUT`` seconds for the prefetch.
+    """
+    try:
+        return threads.result(PREFETCH_TIMEOUT).get(key)
+    except Exception as e:
+        logger.debug("Thread prefetch not used: %r", e)
+        return None
 
 
 class GitHubAPI:
-    def __init__(self, token: str):
-        self.github = Github(token)
+    def __init__(
+        self,
+        token: str,
+        transport: Optional[Transport] = None,
+        result_cache: Optional[ResultCache] = None,
+        base_url: str = GITHUB_API_URL,
+    ):
+        # All processors share one client and one connection pool
+        self.transport = transport or get_default_transport()
+        self.github = self.transport.create_client(token, base_url=base_url)
+        self.result_cache = (
+            result_cache
+            if result_cache is not None
+            else get_default_result_cache()
+        )
+        repo_processor = RepoProcessor(self.github, transport=self.transport)
         self.processors = {
-            "issue": IssueProcessor(self.github),
-            "pr": PRProcessor(self.github),
-            "repo": RepoProcessor(self.github),
-            "regex": RegexProcessor(self.github),
-            # Add file type but use the same RepoProcessor since it can handle both files and directories
-            "file": RepoProcessor(self.github),
-            "content": RepoProcessor(self.github),
+            "issue": IssueProcessor(self.github, self.transport),
+            "pr": PRProcessor(self.github, self.transport),
+            "repo": repo_processor,
+            "regex": RegexProcessor(
+                self.github, self.transport, repo_processor=repo_processor
+            ),
+            # Files and directories are handled by the same RepoProcessor
+            "file": repo_processor,
+            "content": repo_processor,
         }
 
     def process_content(
@@ -30,52 +102,431 @@ class GitHubAPI:
         keep_matching_files: bool,
         line_patterns: Optional[List[str]] = None,
         keep_matching_lines: bool = True,
-    ) -> Tuple[str, bool]:
-        """Process GitHub content with file and line filtering."""
-        output = StringIO()
-        error_occurred = False
-
-        for input_line in inputs:
-            input_type, repo_name, extra_info = parse_github_input(input_line)
-            print(
-                f"Parsed input: type={input_type}, repo={repo_name}, extra={extra_info}"
-            )
+        parallel: bool = PARALLEL_INPUTS,
+        budget: Optional[OutputBudget] = None,
+    ) -> StitchResult:
+        """Process GitHub content with file and line filtering.
+
+        Returns a ``StitchResult`` that yields output chunks as they are
+        produced; nothing is fetched until it is iterated. With ``parallel``
+        set, inputs are dispatched to their processors concurrently (at most
+        ``INPUT_CONCURRENCY`` at a time) and each one is abandoned after
+        ``INPUT_TIMEOUT`` seconds. Output always follows the order of
+        ``inputs``. Pull request and issue metadata for all inputs is
+        fetched in shared GraphQL queries, and, without a budget,
+        repository inputs are planned together so each repository, tree
+        and blob is fetched once per stitch; both run in the background
+        while the inputs start. The sections of inputs whose
+        source has not changed since an identical stitch are replayed from
+        the result cache.
+
+        ``budget`` caps the size of the output; it defaults to the
+        ``OUTPUT_BUDGET`` configuration. Once it is used up the stitch stops
+        fetching and ends with a footer listing what was left out. The
+        result's ``trace`` times each input and request of the stitch.
+        """
+        if budget is None:
+            budget = make_budget()
+        trace = tracing.new_trace()
+        sections = self._stitch(
+            inputs,
+            file_patterns,
+            keep_matching_files,
+            line_patterns,
+            keep_matching_lines,
+            parallel,
+            budget,
+        )
+        return StitchResult(self._traced(trace, sections), trace)
 
-            if input_type is None:
-                output.write(f"\nInvalid input: {input_line}\n")
-                error_occurred = True
-                continue
+    def _traced(
+        self, trace: Optional[tracing.Trace], sections: Iterator
+    ) -> Iterator[Tuple[str, bool]]:
+        """Run a stitch with its trace active and finish the trace after."""
+        if trace is None:
+            yield from sections
+            return
+        try:
+            with tracing.activate(trace):
+                yield from sections
+        finally:
+            trace.finish()
+
+    def _stitch(
+        self,
+        inputs: List[str],
+        file_patterns: List[str],
+        keep_matching_files: bool,
+        line_patterns: Optional[List[str]],
+        keep_matching_lines: bool,
+        parallel: bool,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[Tuple[str, bool]]:
+        try:
+            filters = FilterSet(
+                file_patterns,
+                keep_matching_files,
+                line_patterns,
+                keep_matching_lines,
+            )
+        except re.error as e:
+            yield f"\nInvalid filter pattern: {str(e)}\n", True
+            return
+        filter_kwargs = dict(
+            file_patterns=file_patterns,
+            keep_matching_files=keep_matching_files,
+            line_patterns=line_patterns,
+            keep_matching_lines=keep_matching_lines,
+            filters=filters,
+            budget=budget,
+        )
+        jobs = [
+            (input_line, parse_github_input(input_line))
+            for input_line in inputs
+        ]
+        with tracing.phase("prefetch_threads"):
+            threads = self._prefetch_threads([parsed for _, parsed in jobs])
+        with tracing.phase("plan"):
+            # Under a budget, trees are listed only as inputs get their turn
+            plan = plan_stitch(
+                self.processors["repo"],
+                jobs,
+                filters,
+                list_trees=budget is None,
+            )
 
-            output.write(f"\n\n--- Content from {input_line} ---\n")
+        if parallel:
+            sections = self._process_parallel(
+                jobs, filter_kwargs, threads, plan, budget
+            )
+        else:
+            sections = self._process_sequential(
+                jobs, filter_kwargs, threads, plan
+            )
+        try:
+            if budget is None:
+                for _, chunk, failed in sections:
+                    yield chunk, failed
+            else:
+                yield from self._spend(budget, jobs, sections)
+        finally:
+            plan.close()
 
+    def _process_sequential(
+        self,
+        jobs: List[Tuple[str, tuple]],
+        filter_kwargs: dict,
+        threads: Future,
+        plan: StitchPlan,
+    ) -> Iterator[Tuple[int, str, bool]]:
+        for index, (input_line, parsed) in enumerate(jobs):
+            chunks = self._process_input(
+                index, input_line, parsed, filter_kwargs, threads, plan
+            )
             try:
-                processor = self.processors.get(input_type)
-                if processor:
-                    print(f"Using processor: {processor.__class__.__name__}")
-                    content = processor.process(
-                        repo_name,
-                        extra_info,
-                        file_patterns=file_patterns,
-                        keep_matching_files=keep_matching_files,
-                        line_patterns=line_patterns,
-                        keep_matching_lines=keep_matching_lines,
-                    )
-                    output.write(content)
+                for chunk, failed in chunks:
+                    yield index, chunk, failed
+            finally:
+                chunks.close()
+
+    def _spend(
+        self,
+        budget: OutputBudget,
+        jobs: List[Tuple[str, tuple]],
+        sections: Iterator[Tuple[int, str, bool]],
+    ) -> Iterator[Tuple[str, bool]]:
+        """Charge output chunks to the budget until it is used up.
+
+        Closing ``sections`` then cancels the work still in flight. The
+        footer names the files of the current input that were announced
+        but not emitted in full, and every later input.
+        """
+        announced: Dict[int, List[str]] = {}
+        emitted = set()  # (input index, path) of files emitted so far
+        started = set()  # Inputs with some output emitted
+        try:
+            for index, chunk, failed in sections:
+                if isinstance(chunk, FileList):
+                    announced.setdefault(index, []).extend(chunk.paths)
+                    continue
+                text = budget.take(chunk)
+                if text:
+                    started.add(index)
+                    yield text, failed
+                if not budget.exhausted:
+                    if isinstance(chunk, FileSection):
+                        emitted.add((index, chunk.path))
+                    continue
+                if isinstance(chunk, FileSection):
+                    emitted.discard((index, chunk.path))  # Cut short
+                omitted = []
+                if index in started:
+                    paths = [
+                        path
+                        for path in announced.get(index, [])
+                        if (index, path) not in emitted
+                    ]
+                    omitted.append((jobs[index][0], paths or None))
                 else:
-                    output.write(f"Unsupported input type: {input_type}\n")
-                    error_occurred = True
-
-            except GithubException as e:
-                error_msg = self._handle_github_exception(e)
-                print(f"GitHub Exception: {error_msg}")
-                output.write(error_msg)
-                error_occurred = True
+                    omitted.append((jobs[index][0], []))
+                for input_line, _ in jobs[index + 1:]:
+                    omitted.append((input_line, []))
+                logger.debug("Output budget reached at input %d", index)
+                yield budget.footer(omitted), False
+                return
+        finally:
+            sections.close()
+
+    def _prefetch_threads(self, parsed_inputs: List[tuple]) -> Future:
+        """Fetch all pull requests and issues in a few GraphQL round trips.
+
+        The fetch runs in the background, so no input waits for it before
+        it starts. Returns a future of a dict keyed by ``(input type,
+        repo, number)``; inputs missing from it, or whose prefetch is not
+        done in time, are fetched by their processor as usual.
+        """
+        keys = [_thread_key(parsed) for parsed in parsed_inputs]
+        keys = [key for key in keys if key is not None]
+        if not keys:
+            threads = Future()
+            threads.set_result({})
+            return threads
+
+        def prefetch() -> dict:
+            try:
+                return fetch_threads(self.github, keys)
             except Exception as e:
-                print(f"Unexpected error: {str(e)}")
-                output.write(f"An error occurred: {str(e)}\n")
-                error_occurred = True
+                logger.warning("GraphQL thread prefetch failed: %s", e)
+                return {}
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        threads = executor.submit(tracing.bind(prefetch))
+        executor.shutdown(wait=False)
+        return threads
+
+    def _process_parallel(
+        self,
+        jobs: List[Tuple[str, tuple]],
+        filter_kwargs: dict,
+        threads: Future,
+        plan: StitchPlan,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[Tuple[int, str, bool]]:
+        """Run inputs concurrently and stream their chunks in input order.
+
+        Each worker pushes its chunks onto a per-input queue. The queue of
+        the input currently being emitted is drained as it fills; later
+        inputs buffer until their turn. Under a budget, inputs only run
+        ``OUTPUT_LOOKAHEAD_CHUNKS`` chunks ahead, so little is fetched past
+        the point where the budget runs out.
+        """
+        started_at = {}
+        maxsize = OUTPUT_LOOKAHEAD_CHUNKS if budget is not None else 0
+        sinks = [queue.Queue(maxsize=maxsize) for _ in jobs]
+        cancelled = [threading.Event() for _ in jobs]
+
+        def push(index: int, item) -> bool:
+            waited_at = None
+            while not cancelled[index].is_set():
+                try:
+                    sinks[index].put(item, timeout=0.1)
+                except queue.Full:
+                    if waited_at is None:
+                        waited_at = time.monotonic()
+                    continue
+                if waited_at is not None:
+                    # Time spent waiting for its turn does not count
+                    # towards the input's timeout
+                    started_at[index] += time.monotonic() - waited_at
+                return True
+            return False
+
+        def run(index: int, input_line: str, parsed: tuple) -> None:
+            started_at[index] = time.monotonic()
+            chunks = self._process_input(
+                index, input_line, parsed, filter_kwargs, threads, plan
+            )
+            try:
+                for chunk in chunks:
+                    if not push(index, chunk):
+                        break
+            finally:
+                chunks.close()
+                push(index, _DONE)
+
+        executor = ThreadPoolExecutor(max_workers=INPUT_CONCURRENCY)
+        try:
+            for index, (input_line, parsed) in enumerate(jobs):
+                executor.submit(tracing.bind(run), index, input_line, parsed)
+
+            for index, (input_line, _) in enumerate(jobs):
+                emitted = False
+                while True:
+                    # The timeout only starts once a worker picks the input up
+                    start = started_at.get(index)
+                    if start is None:
+                        timeout = 0.1
+                    else:
+                        timeout = max(
+                            start + INPUT_TIMEOUT - time.monotonic(), 0
+                        )
+                    try:
+                        chunk = sinks[index].get(timeout=timeout)
+                    except queue.Empty:
+                        if start is None:
+                            continue
+                        cancelled[index].set()
+                        plan.cancel(index)
+                        logger.warning("Input timed out: %s", input_line)
+                        if not emitted:
+                            header = f"\n\n--- Content from {input_line} ---\n"
+                            yield index, header, False
+                        message = ERROR_MESSAGES["timeout"](INPUT_TIMEOUT)
+                        yield index, message, True
+                        break
+                    if chunk is _DONE:
+                        break
+                    emitted = True
+                    yield (index, *chunk)
+        finally:
+            # Abandoned inputs stop at their next chunk; queued ones are dropped
+            for index, event in enumerate(cancelled):
+                event.set()
+                plan.cancel(index)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _process_input(
+        self,
+        index: int,
+        input_line: str,
+        parsed: tuple,
+        filter_kwargs: dict,
+        threads: Future,
+        plan: StitchPlan,
+    ) -> Iterator[Tuple[str, bool]]:
+        """Yield the output section of a single input line chunk by chunk.
+
+        The input is recorded as a span of the stitch's trace, with the
+        size of its output and whether it failed.
+        """
+        with tracing.input_span(index, input_line, parsed[0]) as span:
+            span.update(output_chars=0, error=False)
+            chunks = self._run_input(
+                index, input_line, parsed, filter_kwargs, threads, plan
+            )
+            try:
+                for chunk, failed in chunks:
+                    span["output_chars"] += len(chunk)
+                    span["error"] = span["error"] or failed
+                    yield chunk, failed
+            finally:
+                chunks.close()
+
+    def _run_input(
+        self,
+        index: int,
+        input_line: str,
+        parsed: tuple,
+        filter_kwargs: dict,
+        threads: Future,
+        plan: StitchPlan,
+    ) -> Iterator[Tuple[str, bool]]:
+        input_type, repo_name, extra_info = parsed
+        logger.debug(
+            "Parsed input: type=%s, repo=%s, extra=%r",
+            input_type,
+            repo_name,
+            extra_info,
+        )
+
+        if input_type is None:
+            yield f"\nInvalid input: {input_line}\n", True
+            return
+
+        yield f"\n\n--- Content from {input_line} ---\n", False
+
+        try:
+            processor = self.processors.get(input_type)
+            if processor:
+                logger.debug(
+                    "Using processor: %s", processor.__class__.__name__
+                )
+                kwargs = dict(filter_kwargs)
+                key = _thread_key(parsed)
+                if key is not None:
+                    kwargs["prefetched"] = _prefetched(threads, key)
+                planned = plan.repo_plan(index)
+                if planned is not None:
+                    kwargs["planned"] = planned
+                    kwargs["shared"] = plan.blobs_for(index)
+                chunks = plan.run(
+                    index,
+                    parsed,
+                    lambda: self._memoized(processor, parsed, kwargs),
+                )
+                for chunk in chunks:
+                    yield chunk, is_error(chunk)
+            else:
+                yield f"Unsupported input type: {input_type}\n", True
+
+        except GithubException as e:
+            error_msg = self._handle_github_exception(e)
+            logger.warning("GitHub exception: %s", error_msg.strip())
+            yield error_msg, True
+        except Exception as e:
+            logger.exception("Unexpected error processing %s", input_line)
+            yield f"An error occurred: {str(e)}\n", True
+
+    def _memoized(
+        self, processor: ContentProcessor, parsed: tuple, kwargs: dict
+    ) -> Iterator[str]:
+        """Run an input through its processor, reusing a memoized result.
+
+        The key holds the version the input's source resolves to now, so a
+        new commit or comment is a miss. Inputs without a version (regex
+        searches, or when resolving fails) always run.
+        """
+        input_type, repo_name, extra_info = parsed
+        resolved = {}  # What resolving the version looked up, for process
+
+        def compute() -> Iterator[str]:
+            return processor.process(
+                repo_name, extra_info, resolved=resolved, **kwargs
+            )
+
+        if self.result_cache is None:
+            return compute()
+        try:
+            if kwargs.get("planned") is not None:
+                version = kwargs["planned"].commit_sha
+            else:
+                version = processor.resolve_version(
+                    repo_name,
+                    extra_info,
+                    prefetched=kwargs.get("prefetched"),
+                    resolved=resolved,
+                )
+        except Exception as e:
+            logger.debug("Could not resolve version: %s", e)
+            version = None
+        if version is None:
+            return compute()
+
+        budget = kwargs.get("budget")
+        key = (
+            input_type,
+            repo_name.lower(),
+            extra_info,
+            version,
+            kwargs["filters"].cache_key,
+            budget.cache_key if budget is not None else None,
+        )
+        return self.result_cache.get_or_compute(key, compute)
 
-        return output.getvalue(), error_occurred
+    def rate_limit_stats(self) -> dict:
+        """Queue depth, wait time and limits of this token's scheduler."""
+        authorization = auth_headers(self.github).get("Authorization")
+        return get_scheduler(authorization).stats()
 
     def _handle_github_exception(self, e: GithubException) -> str:
         if e.status == 404:
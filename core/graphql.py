@@ -0,0 +1,192 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from github import Github
+from github.GithubException import GithubException
+from github.Repository import Repository
+
+from .config import GRAPHQL_PAGE_SIZE, GRAPHQL_THREADS_PER_QUERY
+from .tree import TreeEntry
+
+BLOB_FIELDS = "text byteSize isBinary isTruncated"
+
+ISSUE_THREAD_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $first: Int!,
+      $after: String) {
+  repository(owner: $owner, name: $name) {
+    issue(number: $number) {
+      title author { login } createdAt state body
+      comments(first: $first, after: $after) {
+        pageInfo { hasNextPage endCursor }
+        nodes { author { login } createdAt body }
+      }
+    }
+  }
+}
+"""
+
+THREAD_FIELDS = """
+__typename
+... on Issue {
+  title author { login } createdAt updatedAt state body
+  comments(first: %d) {
+    pageInfo { hasNextPage endCursor }
+    nodes { author { login } createdAt body }
+  }
+}
+... on PullRequest {
+  title author { login } createdAt updatedAt state body
+  baseRefName headRefName headRefOid
+}
+"""
+
+# Input types and the GraphQL type a thread of that input must have
+THREAD_TYPES = {"issue": "Issue", "pr": "PullRequest"}
+
+ThreadKey = Tuple[str, str, int]  # (input type, "owner/name", number)
+
+
+def fetch_blobs(
+    github: Github, repo: Repository, entries: List[TreeEntry]
+) -> Dict[str, dict]:
+    """Fetch many blobs in one GraphQL query, keyed by blob SHA.
+
+    Each blob is an aliased ``object(oid:)`` lookup, so the query does not
+    depend on ref or path quoting. Values hold ``text``, ``byteSize``,
+    ``isBinary`` and ``isTruncated``; binary blobs come back without text,
+    so they cost nothing to skip. Blobs GitHub could not resolve are
+    missing from the result.
+    """
+    shas = list(dict.fromkeys(entry.sha for entry in entries))
+    fields = "\n".join(
+        f'b{index}: object(oid: "{sha}") {{ ... on Blob {{ {BLOB_FIELDS} }} }}'
+        for index, sha in enumerate(shas)
+    )
+    query = (
+        "query($owner: String!, $name: String!) {\n"
+        f"  repository(owner: $owner, name: $name) {{\n{fields}\n  }}\n"
+        "}"
+    )
+    data = _query(
+        github, query, {"owner": repo.owner.login, "name": repo.name}
+    )
+
+    repository = data.get("repository") or {}
+    blobs = {}
+    for index, sha in enumerate(shas):
+        blob = repository.get(f"b{index}")
+        if blob:
+            blobs[sha] = blob
+    return blobs
+
+
+def iter_issue_thread(
+    github: Github,
+    owner: str,
+    name: str,
+    number: int,
+    page_size: int = GRAPHQL_PAGE_SIZE,
+    after: Optional[str] = None,
+) -> Iterator[dict]:
+    """Yield an issue, then each of its comments as their pages arrive.
+
+    The first query returns the issue together with its first page of
+    comments; later pages follow the comments cursor. When resuming from
+    an ``after`` cursor only the remaining comments are yielded. Raises
+    ValueError when the repository has no issue with that number (pull
+    requests are not issues in the GraphQL schema).
+    """
+    variables = {
+        "owner": owner,
+        "name": name,
+        "number": number,
+        "first": page_size,
+        "after": after,
+    }
+    resumed = after is not None
+    while True:
+        data = _query(github, ISSUE_THREAD_QUERY, variables)
+        issue = (data.get("repository") or {}).get("issue")
+        if issue is None:
+            raise ValueError(f"Issue #{number} not found in {owner}/{name}")
+
+        comments = issue.pop("comments")
+        if variables["after"] is None and not resumed:
+            yield issue
+        yield from comments["nodes"]
+
+        page_info = comments["pageInfo"]
+        if not page_info["hasNextPage"]:
+            return
+        variables["after"] = page_info["endCursor"]
+
+
+def fetch_threads(
+    github: Github,
+    keys: List[ThreadKey],
+    page_size: int = GRAPHQL_PAGE_SIZE,
+) -> Dict[ThreadKey, dict]:
+    """Fetch many issues and pull requests in a few aliased GraphQL queries.
+
+    Up to ``GRAPHQL_THREADS_PER_QUERY`` threads share one round trip,
+    grouped under one ``repository`` lookup per repo. Issues include their
+    first page of comments (as ``comments``). Threads that do not exist,
+    or whose type does not match the input type, are missing from the
+    result.
+    """
+    keys = list(dict.fromkeys(keys))
+    threads = {}
+    for start in range(0, len(keys), GRAPHQL_THREADS_PER_QUERY):
+        batch = keys[start : start + GRAPHQL_THREADS_PER_QUERY]
+        by_repo = {}
+        for index, key in enumerate(batch):
+            by_repo.setdefault(key[1], []).append((index, key))
+
+        fields = THREAD_FIELDS % page_size
+        repositories = []
+        for repo_index, (repo_name, items) in enumerate(by_repo.items()):
+            owner, name = repo_name.split("/", 1)
+            selections = "\n".join(
+                f"t{index}: issueOrPullRequest(number: {key[2]}) {{{fields}}}"
+                for index, key in items
+            )
+            repositories.append(
+                f"r{repo_index}: repository(owner: {json.dumps(owner)}, "
+                f"name: {json.dumps(name)}) {{\n{selections}\n}}"
+            )
+        data = _query(github, "{\n" + "\n".join(repositories) + "\n}", {})
+
+        for repo_index, items in enumerate(by_repo.values()):
+            repository = data.get(f"r{repo_index}") or {}
+            for index, key in items:
+                thread = repository.get(f"t{index}")
+                if thread and thread["__typename"] == THREAD_TYPES[key[0]]:
+                    threads[key] = thread
+    return threads
+
+
+def _query(github: Github, query: str, variables: dict) -> dict:
+    """Run a query and return its ``data``, even when parts of it failed.
+
+    GitHub answers a query with some unresolvable fields (e.g. a deleted
+    issue) with both ``data`` and ``errors``; PyGithub raises on the
+    errors, so the partial data is taken from the exception.
+    """
+    try:
+        _, response = github.requester.graphql_query(query, variables)
+    except GithubException as e:
+        if not isinstance(e.data, dict) or not e.data.get("data"):
+            raise
+        response = e.data
+    return response.get("data") or {}
+
+
+def author_login(node: dict) -> str:
+    """Login of a node's author; deleted accounts show as ``ghost``."""
+    return (node.get("author") or {}).get("login") or "ghost"
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse a GraphQL ``DateTime`` the way PyGithub reports timestamps."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
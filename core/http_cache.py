@@ -0,0 +1,230 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Callable, Optional
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .blob_cache import BlobCache
+from .config import (
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_ENABLED,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_MAX_STREAM_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe the transfer rather than the cached body
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+# Headers of a 304 that should replace the stored ones
+_FRESH_HEADERS = {"date", "etag", "last-modified", "cache-control"}
+
+
+class HTTPCache:
+    """Store of GET response bodies with their ETag / Last-Modified values.
+
+    Entries are kept in a ``BlobCache`` keyed by a digest of the method,
+    URL, Accept header and credentials, so different tokens never share
+    cached responses.
+    """
+
+    def __init__(self, store: BlobCache):
+        self.store = store
+
+    def key(self, request: PreparedRequest) -> str:
+        parts = [
+            request.method or "",
+            request.url or "",
+            request.headers.get("Accept", ""),
+            request.headers.get("Authorization", ""),
+        ]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.store.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def put(
+        self, key: str, response: Response, content: Optional[bytes] = None
+    ) -> None:
+        """Store the body of ``response``, or ``content`` read from it."""
+        if content is None:
+            content = response.content
+        try:
+            body = content.decode("utf-8")
+        except UnicodeDecodeError:
+            return  # Only text payloads are cached
+
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in _TRANSFER_HEADERS
+        }
+        entry = {"headers": headers, "body": body, "encoding": response.encoding}
+        self.store.put(key, json.dumps(entry))
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """Transport adapter that revalidates cached GET responses.
+
+    Repeat requests carry ``If-None-Match`` / ``If-Modified-Since``. A 304
+    answer, which does not count against GitHub's rate limit, is turned back
+    into a 200 response built from the stored body. Streamed requests are
+    revalidated too: a 304 streams the stored body, and a 200 text body is
+    stored as it is read, unless it grows past ``HTTP_CACHE_MAX_STREAM_BYTES``.
+    Ranged requests are passed through untouched.
+    """
+
+    def __init__(self, cache: Optional["HTTPCache"] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request: PreparedRequest, stream: bool = False, **kwargs):
+        if (
+            self.cache is None
+            or request.method != "GET"
+            or "Range" in request.headers
+        ):
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            stored = CaseInsensitiveDict(entry["headers"])
+            if "ETag" in stored:
+                request.headers["If-None-Match"] = stored["ETag"]
+            if "Last-Modified" in stored:
+                request.headers["If-Modified-Since"] = stored["Last-Modified"]
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            if stream:
+                response.close()  # Hand the connection back to the pool
+            return self._from_cache(request, response, entry)
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            if not stream:
+                self.cache.put(key, response)
+            elif _is_text(request, response):
+                response.raw = _CachingStream(
+                    response.raw,
+                    lambda content: self.cache.put(key, response, content),
+                )
+        response.from_cache = False
+        return response
+
+    def _from_cache(
+        self, request: PreparedRequest, not_modified: Response, entry: dict
+    ) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        # Keep rate-limit and other per-request headers from the live 304
+        for name, value in not_modified.headers.items():
+            lowered = name.lower()
+            if lowered in _FRESH_HEADERS or lowered.startswith("x-"):
+                response.headers[name] = value
+        response._content = entry["body"].encode("utf-8")
+        response._content_consumed = True  # iter_content serves _content
+        response.encoding = entry.get("encoding") or "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+
+class _CachingStream:
+    """Raw response stream that keeps what is read for the HTTP cache.
+
+    Once the body has been read to the end, ``on_complete`` gets it;
+    bodies larger than ``HTTP_CACHE_MAX_STREAM_BYTES`` are dropped
+    instead, as is a body the reader did not finish.
+    """
+
+    def __init__(self, raw, on_complete: Callable[[bytes], None]):
+        self._raw = raw
+        self._on_complete = on_complete
+        self._pieces = []
+        self._size = 0
+
+    def stream(self, amt: int = 2**16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._keep(chunk)
+            yield chunk
+        self._complete()
+
+    def read(self, amt=None, *args, **kwargs) -> bytes:
+        data = self._raw.read(amt, *args, **kwargs)
+        self._keep(data)
+        if amt is None or not data:
+            self._complete()
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _keep(self, data: bytes) -> None:
+        if self._pieces is None or not data:
+            return
+        self._size += len(data)
+        if self._size > HTTP_CACHE_MAX_STREAM_BYTES:
+            self._pieces = None
+        else:
+            self._pieces.append(data)
+
+    def _complete(self) -> None:
+        if self._pieces is not None:
+            pieces, self._pieces = self._pieces, None
+            self._on_complete(b"".join(pieces))
+
+
+def _is_text(request: PreparedRequest, response: Response) -> bool:
+    """Whether a streamed body is text, as opposed to e.g. a tarball.
+
+    GitHub serves diffs and patches with its own media types, such as
+    ``application/vnd.github.diff; charset=utf-8``, so a charset or an
+    ``Accept`` header asking for a diff or patch marks text too.
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    if (
+        content_type.startswith("text/")
+        or "json" in content_type
+        or "charset=" in content_type
+    ):
+        return True
+    accept = request.headers.get("Accept", "").lower()
+    return "diff" in accept or "patch" in accept
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_http_cache() -> Optional[HTTPCache]:
+    """Return the process-wide HTTP cache, or None when it is disabled."""
+    global _default_cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                store = BlobCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+            except OSError as e:
+                logger.warning("HTTP cache disabled: %s", e)
+                return None
+            _default_cache = HTTPCache(store)
+        return _default_cache
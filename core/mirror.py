@@ -0,0 +1,301 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import (
+    DEFAULT_REPO_BACKEND,
+    MIRROR_DIR,
+    MIRROR_FETCH_INTERVAL,
+    MIRROR_GIT_TIMEOUT,
+    MIRROR_REMOTE_URL,
+    MIRROR_REMOTES,
+    REPO_BACKENDS,
+    STREAM_CHUNK_BYTES,
+)
+from .tree import TreeEntry, is_under
+
+logger = logging.getLogger(__name__)
+
+API = "api"
+MIRROR = "mirror"
+
+
+class GitError(RuntimeError):
+    """Raised when a git command run against a mirror fails."""
+
+
+class GitMirror:
+    """Blobless bare clone of one repository, read with git plumbing.
+
+    The clone holds every commit and tree but only the blobs that were
+    read before, so refs are resolved and trees walked locally. Blobs a
+    stitch needs are fetched in one round trip and then read from the
+    local object store with a single ``git cat-file --batch``.
+
+    Every git command that reaches the remote sends ``headers``. Mirrors
+    sharing a directory must share ``lock`` too.
+    """
+
+    def __init__(
+        self,
+        remote_url: str,
+        directory: str,
+        headers: Optional[Dict[str, str]] = None,
+        lock: Optional[threading.Lock] = None,
+    ):
+        self.remote_url = remote_url
+        self.directory = directory
+        self.headers = headers or {}
+        self._lock = lock or threading.Lock()
+        self._fetched_at = None
+
+    def update(self, max_age: float = MIRROR_FETCH_INTERVAL) -> None:
+        """Clone the mirror, or fetch it if it is older than ``max_age``."""
+        with self._lock:
+            if (
+                self._fetched_at is not None
+                and time.monotonic() - self._fetched_at < max_age
+            ):
+                return
+            if not os.path.exists(os.path.join(self.directory, "HEAD")):
+                self._clone()
+            else:
+                logger.debug("Fetching mirror %s", self.remote_url)
+                self._git(
+                    "fetch", "--prune", "--tags", "--quiet", "origin",
+                    cwd=self.directory,
+                )
+                self._update_head()
+            self._fetched_at = time.monotonic()
+
+    def default_branch(self) -> str:
+        head = self._git("symbolic-ref", "--short", "HEAD")
+        return head.decode().strip()
+
+    def resolve(self, ref: str) -> Tuple[str, str]:
+        """Resolve a branch, tag or SHA to its (commit SHA, root tree SHA)."""
+        try:
+            commit_sha = self._git(
+                "rev-parse", "--verify", "--quiet", "--end-of-options",
+                f"{ref}^{{commit}}",
+            )
+        except GitError:
+            raise ValueError(f"ref '{ref}' not found in mirror")
+        commit_sha = commit_sha.decode().strip()
+        tree_sha = self._git("rev-parse", f"{commit_sha}^{{tree}}")
+        return commit_sha, tree_sha.decode().strip()
+
+    def list_blobs(self, tree_sha: str, path: str = "") -> List[TreeEntry]:
+        """List the blobs of a tree at or below ``path``.
+
+        Sizes are not known before a blob is fetched, so every entry has a
+        size of 0; ``iter_blobs`` reports the real one.
+        """
+        path = path.strip("/")
+        listing = self._git("ls-tree", "-r", "-z", "--full-tree", tree_sha)
+        entries = []
+        for record in listing.decode("utf-8", errors="replace").split("\0"):
+            if not record:
+                continue
+            info, entry_path = record.split("\t", 1)
+            _, entry_type, sha = info.split()
+            if entry_type == "blob" and is_under(entry_path, path):
+                entries.append(
+                    TreeEntry(path=entry_path, type="blob", size=0, sha=sha)
+                )
+        return entries
+
+    def prefetch(self, tree_sha: str, shas: Iterable[str]) -> None:
+        """Fetch the blobs of ``shas`` missing from the clone at once.
+
+        Blobs this cannot get are fetched one by one when they are read.
+        """
+        listing = self._git(
+            "rev-list", "--objects", "--missing=print", tree_sha
+        )
+        missing = {
+            line[1:].split()[0]
+            for line in listing.decode().splitlines()
+            if line.startswith("?")
+        }
+        wanted = [sha for sha in shas if sha in missing]
+        if not wanted:
+            return
+        logger.debug("Fetching %d blobs into mirror", len(wanted))
+        try:
+            self._git(
+                "-c", "fetch.negotiationAlgorithm=noop",
+                "fetch", "--quiet", "--no-tags", "--no-write-fetch-head",
+                "--recurse-submodules=no", "--filter=blob:none", "--stdin",
+                "origin",
+                input="".join(sha + "\n" for sha in wanted).encode(),
+            )
+        except GitError as e:
+            logger.warning("Blob prefetch failed: %s", e)
+
+    def iter_blobs(
+        self, shas: List[str]
+    ) -> Iterator[Tuple[str, Optional[int], Iterator[bytes]]]:
+        """Yield ``(sha, size, chunks)`` for each blob, in order.
+
+        ``size`` is None for a blob the clone cannot provide. Whatever is
+        left of ``chunks`` when the next blob is requested is skipped, so
+        a caller can stop reading a blob early.
+        """
+        process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=self.directory,
+            env=self._env(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+        # Requests are written from a thread so a full stdout pipe can
+        # never block the writes
+        def write() -> None:
+            try:
+                for sha in shas:
+                    process.stdin.write(sha.encode() + b"\n")
+                process.stdin.close()
+            except OSError:
+                pass
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        try:
+            for sha in shas:
+                header = process.stdout.readline().split()
+                if len(header) != 3:
+                    yield sha, None, iter(())
+                    continue
+                remaining = [int(header[2])]
+
+                def chunks() -> Iterator[bytes]:
+                    while remaining[0]:
+                        chunk = process.stdout.read(
+                            min(STREAM_CHUNK_BYTES, remaining[0])
+                        )
+                        if not chunk:
+                            raise GitError("git cat-file output ended early")
+                        remaining[0] -= len(chunk)
+                        yield chunk
+
+                yield sha, remaining[0], chunks()
+                for _ in chunks():
+                    pass  # Skip what the caller did not read
+                process.stdout.read(1)  # Newline after the content
+        finally:
+            process.kill()
+            process.wait()
+            writer.join()
+
+    def _clone(self) -> None:
+        logger.info("Cloning mirror of %s", self.remote_url)
+        os.makedirs(os.path.dirname(self.directory), exist_ok=True)
+        tmp_dir = f"{self.directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._git(
+            "clone", "--bare", "--filter=blob:none", "--quiet",
+            self.remote_url, tmp_dir,
+            cwd=os.path.dirname(self.directory),
+        )
+        self._git(
+            "config", "--add", "remote.origin.fetch",
+            "+refs/heads/*:refs/heads/*",
+            cwd=tmp_dir,
+        )
+        os.replace(tmp_dir, self.directory)
+
+    def _update_head(self) -> None:
+        """Follow a change of the remote's default branch."""
+        listing = self._git("ls-remote", "--symref", "origin", "HEAD")
+        for line in listing.decode().splitlines():
+            if line.startswith("ref: ") and line.endswith("\tHEAD"):
+                target = line[len("ref: "):].split("\t")[0]
+                self._git("symbolic-ref", "HEAD", target)
+
+    def _git(
+        self, *args: str, cwd: Optional[str] = None, input: bytes = None
+    ) -> bytes:
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                cwd=cwd or self.directory,
+                env=self._env(),
+                input=input,
+                capture_output=True,
+                timeout=MIRROR_GIT_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise GitError(f"git {args[0]} failed: {str(e)}")
+        if result.returncode != 0:
+            message = result.stderr.decode(errors="replace").strip()
+            raise GitError(f"git {args[0]} failed: {message}")
+        return result.stdout
+
+    def _env(self) -> Dict[str, str]:
+        # Headers go through the environment so tokens stay off the
+        # command line
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        for index, (name, value) in enumerate(self.headers.items()):
+            env[f"GIT_CONFIG_KEY_{index}"] = "http.extraHeader"
+            env[f"GIT_CONFIG_VALUE_{index}"] = f"{name}: {value}"
+        env["GIT_CONFIG_COUNT"] = str(len(self.headers))
+        return env
+
+
+def repo_backend(repo_name: str) -> str:
+    """Return the backend of a repository, ``API`` or ``MIRROR``."""
+    backends = {
+        name.lower(): backend for name, backend in REPO_BACKENDS.items()
+    }
+    return backends.get(repo_name.lower(), DEFAULT_REPO_BACKEND)
+
+
+_mirrors = {}  # (remote URL, credentials digest) -> mirror
+_directory_locks = {}  # Mirror directory -> lock of its git commands
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(
+    repo_name: str,
+    headers: Optional[Dict[str, str]] = None,
+    check_access: Optional[Callable[[], object]] = None,
+) -> GitMirror:
+    """Return the process-wide mirror of a repository for ``headers``.
+
+    The remote is taken from ``MIRROR_REMOTES`` when the repository is
+    listed there (any git URL, ``file://`` included) and is built from
+    ``MIRROR_REMOTE_URL`` otherwise; ``headers`` are only sent to the
+    latter. The clone is stored once per remote, but each set of
+    credentials gets a mirror of its own that fetches with them. Since
+    the clone may hold content fetched with other credentials,
+    ``check_access`` is called first for ``MIRROR_REMOTE_URL`` remotes
+    and should raise unless ``headers`` can read the repository.
+    """
+    remotes = {name.lower(): url for name, url in MIRROR_REMOTES.items()}
+    remote_url = remotes.get(repo_name.lower())
+    if remote_url is None:
+        remote_url = MIRROR_REMOTE_URL.format(repo=repo_name)
+        if check_access is not None:
+            check_access()
+    else:
+        headers = None
+    credentials = hashlib.sha256(
+        repr(sorted((headers or {}).items())).encode("utf-8")
+    ).hexdigest()
+    with _mirrors_lock:
+        mirror = _mirrors.get((remote_url, credentials))
+        if mirror is None:
+            digest = hashlib.sha256(remote_url.encode("utf-8")).hexdigest()
+            directory = os.path.join(MIRROR_DIR, digest[:16] + ".git")
+            lock = _directory_locks.setdefault(directory, threading.Lock())
+            mirror = GitMirror(remote_url, directory, headers, lock)
+            _mirrors[remote_url, credentials] = mirror
+        return mirror
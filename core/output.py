@@ -0,0 +1,81 @@
+import io
+import os
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from .config import SPILL_THRESHOLD_BYTES
+from .tracing import Trace
+
+
+class StitchResult:
+    """Iterable of output chunks produced while a stitch runs.
+
+    ``error_occurred`` becomes True as soon as a failed section has been
+    yielded, so it is final once iteration is complete. ``trace`` records
+    where the time of the stitch went, when tracing is enabled.
+    """
+
+    def __init__(
+        self,
+        sections: Iterable[Tuple[str, bool]],
+        trace: Optional[Trace] = None,
+    ):
+        self._sections = sections
+        self.trace = trace
+        self.error_occurred = False
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk, failed in self._sections:
+            if failed:
+                self.error_occurred = True
+            yield chunk
+
+    def read(self) -> str:
+        """Consume the whole stitch into a single string."""
+        return "".join(self)
+
+
+class SpillBuffer:
+    """Write-once text buffer that moves to a temporary file when large.
+
+    Outputs up to ``max_memory`` bytes stay in memory; anything larger is
+    spilled to disk so a big stitch is not held in memory for the download.
+    """
+
+    def __init__(self, max_memory: int = SPILL_THRESHOLD_BYTES):
+        self.max_memory = max_memory
+        self._file = io.BytesIO()
+        self._path = None  # Set once spilled
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        if self._path is None and self.size + len(data) > self.max_memory:
+            self._spill()
+        self._file.write(data)
+        self.size += len(data)
+
+    def open(self) -> Union[bytes, BinaryIO]:
+        """Content for a download, without copying a spilled file.
+
+        Returns the bytes while the buffer is in memory, and a new reader
+        of the temporary file, at its start, once it was spilled.
+        """
+        if self._path is None:
+            return self._file.getvalue()
+        self._file.flush()
+        return open(self._path, "rb")
+
+    def close(self) -> None:
+        self._file.close()
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+    def _spill(self) -> None:
+        fd, self._path = tempfile.mkstemp(suffix=".md")
+        spilled = os.fdopen(fd, "w+b")
+        spilled.write(self._file.getvalue())
+        self._file = spilled
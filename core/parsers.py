@@ -1,12 +1,15 @@
+import logging
 import re
 from typing import Tuple, Optional, Union
 
+logger = logging.getLogger(__name__)
+
 
 def normalize_github_url(url: str) -> str:
     """Normalize GitHub URLs to ensure they start with https://"""
     if url.startswith(("github.com/", "github.com")):
         normalized = "https://" + url.lstrip("/")
-        print(f"DEBUG: Normalized URL from '{url}' to '{normalized}'")
+        logger.debug("Normalized URL from %r to %r", url, normalized)
         return normalized
     return url
 
@@ -22,11 +25,11 @@ def parse_github_input(
     Optional[str], Optional[str], Optional[Union[str, Tuple[str, str]]]
 ]:
     """Parse GitHub URLs and regex patterns into their components."""
-    print(f"\nDEBUG: Starting to parse input: '{input_line}'")
+    logger.debug("Parsing input: %r", input_line)
 
     # Handle regex patterns
     if input_line.startswith("regex:"):
-        print("DEBUG: Detected regex pattern")
+        logger.debug("Detected regex pattern")
         return "regex", None, input_line[6:].strip()
 
     # Normalize the URL
@@ -36,17 +39,16 @@ def parse_github_input(
     repo_pattern = r"(?:https://)?github\.com/([^/]+/[^/]+)"
     repo_match = re.match(repo_pattern, input_line)
     if not repo_match:
-        print("DEBUG: Failed to match repository pattern")
+        logger.debug("Failed to match repository pattern")
         return None, None, None
 
     repo_name = repo_match.group(1)
     remaining = input_line[repo_match.end() :]
-    print(f"DEBUG: Matched repository: {repo_name}")
-    print(f"DEBUG: Remaining URL part: {remaining}")
+    logger.debug("Matched repository %s, remaining %r", repo_name, remaining)
 
     # Handle tree URLs (directories)
     if remaining.startswith("/tree/"):
-        print("DEBUG: Processing tree URL")
+        logger.debug("Processing tree URL")
         parts = parse_ref_path(remaining[6:])  # Skip /tree/
         if parts:
             branch, path = parts
@@ -54,7 +56,7 @@ def parse_github_input(
 
     # Handle blob URLs (files)
     elif remaining.startswith("/blob/"):
-        print("DEBUG: Processing blob URL")
+        logger.debug("Processing blob URL")
         parts = parse_ref_path(remaining[6:])  # Skip /blob/
         if parts:
             branch, path = parts
@@ -70,7 +72,7 @@ def parse_github_input(
         issue_num = remaining[8:].strip("/")
         return "issue", repo_name, issue_num
 
-    print("DEBUG: No pattern matched")
+    logger.debug("No pattern matched")
     return None, None, None
 
 
@@ -87,7 +89,7 @@ def parse_ref_path(ref_path: str) -> Optional[Tuple[str, str]]:
         return None
 
     ref_path = ref_path.rstrip("/")
-    print(f"DEBUG: Parsing ref_path: {ref_path}")
+    logger.debug("Parsing ref_path: %s", ref_path)
 
     # Find the first real path separator after the ref
     parts = ref_path.split("/")
@@ -100,5 +102,5 @@ def parse_ref_path(ref_path: str) -> Optional[Tuple[str, str]]:
     # Rest is the path (if any)
     path = "/".join(parts[1:]) if len(parts) > 1 else ""
 
-    print(f"DEBUG: Parsed branch: '{branch}', path: '{path}'")
+    logger.debug("Parsed branch: %r, path: %r", branch, path)
     return branch, path
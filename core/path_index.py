@@ -0,0 +1,136 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import List, Optional, Pattern, Tuple
+
+from github.Repository import Repository
+
+from .config import PATH_INDEX_ENABLED, PATH_INDEX_PATH
+from .tree import TreeEntry, list_blobs, resolve_ref
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    full_name TEXT PRIMARY KEY,
+    default_branch TEXT NOT NULL,
+    pushed_at TEXT,
+    commit_sha TEXT NOT NULL,
+    tree_sha TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    blob_sha TEXT NOT NULL,
+    PRIMARY KEY (repo, path)
+);
+"""
+
+
+class PathIndex:
+    """SQLite index of the file paths of every repository a token can see.
+
+    Each repository's default branch manifest is stored with the
+    ``pushed_at`` time it was listed at, and is only listed again once
+    GitHub reports a newer push or a different default branch. Path
+    searches then run against the index, so a search across hundreds of
+    repositories lists only the trees that changed.
+    """
+
+    def __init__(self, path: str = PATH_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def match(
+        self, repo: Repository, regex: Pattern
+    ) -> Tuple[str, List[TreeEntry]]:
+        """Return the indexed commit SHA and the blobs whose path matches.
+
+        The repository is re-listed first when its index entry is stale.
+        Paths are matched with ``regex.match``, in path order.
+        """
+        commit_sha = self.refresh(repo)
+        with closing(self._connect()) as conn:
+            conn.create_function(
+                "path_matches", 1, lambda path: bool(regex.match(path))
+            )
+            rows = conn.execute(
+                "SELECT path, size, blob_sha FROM files "
+                "WHERE repo = ? AND path_matches(path) ORDER BY path",
+                (repo.full_name,),
+            ).fetchall()
+        entries = [
+            TreeEntry(path=path, type="blob", size=size, sha=sha)
+            for path, size, sha in rows
+        ]
+        return commit_sha, entries
+
+    def refresh(self, repo: Repository) -> str:
+        """List ``repo`` again if it changed since it was indexed.
+
+        Returns the commit SHA the index holds for the default branch.
+        """
+        pushed_at = repo.pushed_at.isoformat() if repo.pushed_at else None
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT default_branch, pushed_at, commit_sha FROM repos "
+                "WHERE full_name = ?",
+                (repo.full_name,),
+            ).fetchone()
+        if row is not None and row[:2] == (repo.default_branch, pushed_at):
+            return row[2]
+
+        logger.debug("Indexing paths of %s", repo.full_name)
+        commit_sha, tree_sha = resolve_ref(repo, repo.default_branch)
+        entries = list_blobs(repo, tree_sha)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM files WHERE repo = ?", (repo.full_name,))
+            conn.executemany(
+                "INSERT INTO files (repo, path, size, blob_sha) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (repo.full_name, entry.path, entry.size, entry.sha)
+                    for entry in entries
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO repos "
+                "(full_name, default_branch, pushed_at, commit_sha, tree_sha) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    repo.full_name,
+                    repo.default_branch,
+                    pushed_at,
+                    commit_sha,
+                    tree_sha,
+                ),
+            )
+        return commit_sha
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps worker threads apart
+        return sqlite3.connect(self.path, timeout=30)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_path_index() -> Optional[PathIndex]:
+    """Return the process-wide path index, or None when it is disabled."""
+    global _default_index
+    if not PATH_INDEX_ENABLED:
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            try:
+                _default_index = PathIndex()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Path index disabled: %s", e)
+                return None
+        return _default_index
@@ -0,0 +1,340 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from github.Repository import Repository
+
+from .config import FETCH_CONCURRENCY, INPUT_TIMEOUT, SHARED_BLOB_WAIT
+from .filters import FilterSet
+from .mirror import MIRROR, repo_backend
+from .result_cache import ResultCache
+from .tracing import bind
+from .tree import TreeEntry, is_under
+
+logger = logging.getLogger(__name__)
+
+# Input types read from repository trees by the RepoProcessor
+REPO_INPUT_TYPES = ("repo", "file", "content")
+
+
+@dataclass
+class RepoPlan:
+    """Resolved repository, ref and manifest of one repository input."""
+
+    repo: Repository
+    ref: str
+    commit_sha: str
+    entries: List[TreeEntry]  # Blobs at or below the input's path
+
+
+class SharedBlobs:
+    """Texts of blobs several inputs of a stitch need, downloaded once.
+
+    Each blob is owned by the first input needing it, which downloads it
+    as usual and hands the text over; later inputs wait for the text
+    instead of downloading the blob again. A text is dropped once every
+    input took it. Blobs an owner skips, or has not delivered when it
+    finishes, are released, and inputs still needing them download them
+    on their own. So does an input that waited ``wait`` seconds in vain.
+    """
+
+    def __init__(self, wait: float = SHARED_BLOB_WAIT):
+        self.wait = wait
+        self._cond = threading.Condition()
+        self._owners: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}  # sha -> inputs yet to take it
+        self._texts: Dict[str, str] = {}
+        self._released: Set[str] = set()
+        self._cancelled: Set[int] = set()
+
+    def add(self, sha: str, index: int) -> None:
+        """Record that input ``index`` needs blob ``sha``."""
+        if self._owners.setdefault(sha, index) != index:
+            self._waiting[sha] = self._waiting.get(sha, 0) + 1
+
+    def prune(self) -> None:
+        """Forget blobs only one input needs."""
+        self._owners = {
+            sha: index
+            for sha, index in self._owners.items()
+            if sha in self._waiting
+        }
+
+    def for_input(self, index: int) -> "InputBlobs":
+        return InputBlobs(self, index)
+
+    def waits_for(self, sha: str, index: int) -> bool:
+        with self._cond:
+            owner = self._owners.get(sha)
+            return (
+                owner is not None
+                and owner != index
+                and sha not in self._released
+            )
+
+    def take(self, sha: str, index: int) -> Optional[str]:
+        """Wait for the owner's text of ``sha``.
+
+        Returns None, and the input downloads the blob itself, if the
+        owner released it, the wait timed out or the input was cancelled.
+        """
+        deadline = time.monotonic() + self.wait
+        with self._cond:
+            while sha not in self._texts and sha not in self._released:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or index in self._cancelled:
+                    break
+                self._cond.wait(remaining)
+            text = self._texts.get(sha)
+            self._waiting[sha] -= 1
+            if not self._waiting[sha]:
+                self._texts.pop(sha, None)
+            return text
+
+    def put(self, sha: str, text: str, index: int) -> None:
+        with self._cond:
+            if (
+                self._owners.get(sha) != index
+                or sha in self._released
+                or not self._waiting.get(sha)
+            ):
+                return
+            self._texts[sha] = text
+            self._cond.notify_all()
+
+    def release(self, sha: str, index: int) -> None:
+        """Let the inputs waiting for ``sha`` download it on their own."""
+        with self._cond:
+            if self._owners.get(sha) == index and sha not in self._texts:
+                self._released.add(sha)
+                self._cond.notify_all()
+
+    def cancel(self, index: int) -> None:
+        """Stop input ``index`` from waiting for blobs any longer."""
+        with self._cond:
+            self._cancelled.add(index)
+            self._cond.notify_all()
+
+    def cancelled(self, index: int) -> bool:
+        with self._cond:
+            return index in self._cancelled
+
+    def finish(self, index: int) -> None:
+        """Release every blob input ``index`` owns and did not deliver."""
+        with self._cond:
+            for sha, owner in self._owners.items():
+                if owner == index and sha not in self._texts:
+                    self._released.add(sha)
+            self._cond.notify_all()
+
+
+class InputBlobs:
+    """The view one input has of the blobs it shares with others."""
+
+    def __init__(self, shared: SharedBlobs, index: int):
+        self.shared = shared
+        self.index = index
+
+    def waits_for(self, sha: str) -> bool:
+        """Whether another input downloads ``sha`` for this one."""
+        return self.shared.waits_for(sha, self.index)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.shared.cancelled(self.index)
+
+    def take(self, sha: str) -> Optional[str]:
+        return self.shared.take(sha, self.index)
+
+    def put(self, sha: str, text: str) -> None:
+        """Hand the text of a downloaded blob to the inputs waiting for it."""
+        self.shared.put(sha, text, self.index)
+
+    def release(self, sha: str) -> None:
+        """Give up on delivering ``sha``, e.g. because it was skipped."""
+        self.shared.release(sha, self.index)
+
+
+@dataclass
+class StitchPlan:
+    """How the inputs of one stitch share their work.
+
+    Identical inputs run once and the others replay the output. Inputs
+    reading the same repository and ref share one repository lookup, and
+    one tree listing covers inputs whose paths are nested in each other;
+    blobs several inputs of a repository need are downloaded once.
+    Repositories are planned concurrently in the background, and each
+    input only waits for the plan of its own repository.
+    """
+
+    repeated: Set[tuple] = field(default_factory=set)  # Keys seen twice
+    duplicates: ResultCache = field(default_factory=ResultCache)
+    # Input index -> planning of its repository, and the blobs it shares
+    plans: Dict[int, Future] = field(default_factory=dict)
+    shared: Dict[int, SharedBlobs] = field(default_factory=dict)
+
+    def repo_plan(
+        self, index: int, timeout: float = INPUT_TIMEOUT
+    ) -> Optional[RepoPlan]:
+        """Wait for the plan of input ``index``.
+
+        Returns None, and the input is left to its processor, if it was
+        not planned, planning failed or took longer than ``timeout``.
+        """
+        future = self.plans.get(index)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout).get(index)
+        except Exception as e:
+            logger.debug("Input %d runs unplanned: %s", index, e)
+            return None
+
+    def blobs_for(self, index: int) -> Optional[InputBlobs]:
+        shared = self.shared.get(index)
+        return shared.for_input(index) if shared is not None else None
+
+    def cancel(self, index: int) -> None:
+        """Stop input ``index`` from waiting for shared blobs."""
+        shared = self.shared.get(index)
+        if shared is not None:
+            shared.cancel(index)
+
+    def close(self) -> None:
+        """Drop the planning of repositories no input waits for anymore."""
+        for future in self.plans.values():
+            future.cancel()
+
+    def run(
+        self,
+        index: int,
+        parsed: tuple,
+        compute: Callable[[], Iterator[str]],
+    ) -> Iterator[str]:
+        """Yield an input's output, computed once for identical inputs."""
+        key = _input_key(parsed)
+        try:
+            if key in self.repeated:
+                yield from self.duplicates.get_or_compute(key, compute)
+            else:
+                yield from compute()
+        finally:
+            shared = self.shared.get(index)
+            if shared is not None:
+                shared.finish(index)
+
+
+def plan_stitch(
+    repo_processor,
+    jobs: List[Tuple[str, tuple]],
+    filters: FilterSet,
+    list_trees: bool = True,
+) -> StitchPlan:
+    """Plan the repository inputs of a stitch.
+
+    Repositories are looked up once and only the sub-trees the inputs
+    read are listed. This runs in the background, concurrently per
+    repository, so the plan is returned at once and inputs start while
+    it is made. Inputs whose repository could not be planned are left to
+    their processor, which reports the error. Without ``list_trees`` only
+    identical inputs are planned, and nothing is fetched for the plan.
+    """
+    plan = StitchPlan()
+    seen = set()
+    by_repo: Dict[str, List[int]] = {}
+    for index, (_, parsed) in enumerate(jobs):
+        input_type, repo_name, _ = parsed
+        if input_type is None:
+            continue
+        key = _input_key(parsed)
+        if key in seen:
+            plan.repeated.add(key)
+            continue  # Replays the first identical input
+        seen.add(key)
+        if input_type not in REPO_INPUT_TYPES or not list_trees:
+            continue
+        if repo_backend(repo_name) == MIRROR:
+            continue  # Reads are local already
+        by_repo.setdefault(repo_name.lower(), []).append(index)
+    if not by_repo:
+        return plan
+
+    def plan_repo(repo_key: str) -> Dict[int, RepoPlan]:
+        indexes = by_repo[repo_key]
+        repo = repo_processor.get_repo(jobs[indexes[0]][1][1])
+        wanted = {}
+        for index in indexes:
+            path, ref = _path_and_ref(jobs[index][1][2])
+            wanted[index] = (path, ref or repo.default_branch)
+        # One listing per ref and outermost path; nested paths reuse it
+        manifests = {}
+        for path, ref in sorted(set(wanted.values())):
+            if not any(
+                is_under(path, listed)
+                for listed_ref, listed in manifests
+                if listed_ref == ref
+            ):
+                manifests[ref, path] = repo_processor._get_manifest(
+                    repo, ref, path
+                )
+        plans = {}
+        for index, (path, ref) in wanted.items():
+            commit_sha, entries = next(
+                manifest
+                for (listed_ref, listed), manifest in manifests.items()
+                if listed_ref == ref and is_under(path, listed)
+            )
+            plans[index] = RepoPlan(
+                repo=repo,
+                ref=ref,
+                commit_sha=commit_sha,
+                entries=[
+                    entry for entry in entries if is_under(entry.path, path)
+                ],
+            )
+        return plans
+
+    def plan_group(
+        repo_key: str, shared: SharedBlobs
+    ) -> Dict[int, RepoPlan]:
+        try:
+            plans = plan_repo(repo_key)
+        except Exception as e:
+            logger.debug("Could not plan %s: %s", repo_key, e)
+            raise
+        # Registered before any input of the group gets its plan
+        for index, repo_plan in plans.items():
+            for entry in repo_plan.entries:
+                if filters.include_path(entry.path):
+                    shared.add(entry.sha, index)
+        shared.prune()
+        logger.debug("Planned %d inputs of %s", len(plans), repo_key)
+        return plans
+
+    executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY)
+    for repo_key, indexes in by_repo.items():
+        shared = SharedBlobs()
+        future = executor.submit(bind(plan_group), repo_key, shared)
+        for index in indexes:
+            plan.plans[index] = future
+            plan.shared[index] = shared
+    executor.shutdown(wait=False)
+    return plan
+
+
+def _path_and_ref(extra_info) -> Tuple[str, str]:
+    if isinstance(extra_info, tuple):
+        path, ref = extra_info
+        return path.strip("/"), ref or ""
+    return "", ""
+
+
+def _input_key(parsed: tuple) -> tuple:
+    input_type, repo_name, extra_info = parsed
+    if input_type in REPO_INPUT_TYPES:
+        input_type = "repo"  # Same processor and output for all three
+        extra_info = _path_and_ref(extra_info)
+    return input_type, (repo_name or "").lower(), extra_info
@@ -1,16 +1,41 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from github import Github
 from github.Repository import Repository
+from ..transport import Transport, auth_headers, get_default_transport
 
 
 class ContentProcessor(ABC):
-    def __init__(self, github_client: Github):
+    def __init__(
+        self, github_client: Github, transport: Optional[Transport] = None
+    ):
         self.github = github_client
+        self.transport = transport or get_default_transport()
 
     @abstractmethod
-    def process(self, repo_name: str, extra_info: any) -> str:
+    def process(self, repo_name: str, extra_info: any) -> Iterator[str]:
+        """Yield output sections as soon as each one is available."""
         pass
 
+    def resolve_version(
+        self,
+        repo_name: str,
+        extra_info: any,
+        prefetched: Optional[dict] = None,
+        resolved: Optional[dict] = None,
+    ) -> Optional[str]:
+        """Return the immutable version an input currently resolves to.
+
+        The output for the same input, version and filters never changes,
+        so it can be reused. None means the output cannot be memoized.
+        What is looked up on the way may be kept in ``resolved``, which is
+        passed on to ``process`` so it is not looked up twice.
+        """
+        return None
+
     def get_repo(self, repo_name: str) -> Repository:
         return self.github.get_repo(repo_name)
+
+    def auth_headers(self) -> dict:
+        """Authorization header for raw requests made outside PyGithub."""
+        return auth_headers(self.github)
@@ -1,5 +1,12 @@
-from typing import Optional, List
+import logging
+from itertools import chain
+from typing import Iterator, Optional, List
 from .base import ContentProcessor
+from .. import tracing
+from ..filters import FilterSet
+from ..graphql import author_login, iter_issue_thread, parse_datetime
+
+logger = logging.getLogger(__name__)
 
 
 class IssueProcessor(ContentProcessor):
@@ -11,42 +18,146 @@ class IssueProcessor(ContentProcessor):
         keep_matching_files: bool = True,
         line_patterns: Optional[List[str]] = None,
         keep_matching_lines: bool = True,
+        filters: Optional[FilterSet] = None,
+        prefetched: Optional[dict] = None,
         **kwargs,
-    ) -> str:
-        """Process a GitHub issue and its comments into markdown format."""
+    ) -> Iterator[str]:
+        """Yield a GitHub issue and its comments in markdown format.
+
+        The issue and its comments come from one cursor-paginated GraphQL
+        query, and each page of comments is written as soon as it arrives.
+        ``prefetched`` is the issue with its first comment page when it was
+        already fetched in a batch with other inputs. Line filters apply to
+        the issue body and to every comment body.
+        """
+        if filters is None:
+            filters = FilterSet(
+                line_patterns=line_patterns,
+                keep_matching_lines=keep_matching_lines,
+            )
         try:
-            print(
-                f"Processing issue: repo={repo_name}, issue={issue_number}"
-            )  # Debug line
-            repo = self.get_repo(repo_name)
-            issue = repo.get_issue(int(issue_number))
-
-            content = []
-            # Add issue header
-            content.extend(
-                [
-                    f"# {issue.title}\n",
-                    f"**Author:** {issue.user.login}  \n",
-                    f"**Created:** {issue.created_at}  \n",
-                    f"**State:** {issue.state}  \n\n",
-                    "## Original Post\n\n",
-                    issue.body or "*No description provided*",
-                    "\n\n---\n\n",
-                    "## Comments\n\n",
-                ]
+            logger.debug(
+                "Processing issue: repo=%s, issue=%s", repo_name, issue_number
             )
-
-            # Add comments
-            for comment in issue.get_comments():
-                content.extend(
-                    [
-                        f"### {comment.user.login} - {comment.created_at}\n\n",
-                        f"{comment.body}\n\n",
-                        "---\n\n",
-                    ]
+            owner, name = repo_name.split("/", 1)
+            if prefetched is not None:
+                issue = prefetched
+                comments = prefetched["comments"]
+                thread = iter(comments["nodes"])
+                if comments["pageInfo"]["hasNextPage"]:
+                    thread = chain(
+                        thread,
+                        iter_issue_thread(
+                            self.github,
+                            owner,
+                            name,
+                            int(issue_number),
+                            after=comments["pageInfo"]["endCursor"],
+                        ),
+                    )
+            else:
+                thread = iter_issue_thread(
+                    self.github, owner, name, int(issue_number)
                 )
+                try:
+                    issue = next(thread)
+                except Exception as e:
+                    logger.warning("GraphQL issue fetch failed: %s", e)
+                    yield from self._process_rest(
+                        repo_name, issue_number, filters
+                    )
+                    return
 
-            return "".join(content)
+            yield self._format_header(
+                issue["title"],
+                author_login(issue),
+                parse_datetime(issue["createdAt"]),
+                issue["state"].lower(),
+                issue["body"],
+                filters,
+            )
+            for comment in thread:
+                section = self._format_comment(
+                    author_login(comment),
+                    parse_datetime(comment["createdAt"]),
+                    comment["body"],
+                    filters,
+                )
+                tracing.count("issue", "comments")
+                if section:
+                    yield section
         except Exception as e:
-            print(f"Error in IssueProcessor: {str(e)}")  # Debug line
+            logger.warning("Error in IssueProcessor: %s", e)
             raise
+
+    def resolve_version(
+        self,
+        repo_name: str,
+        issue_number: str,
+        prefetched: Optional[dict] = None,
+        resolved: Optional[dict] = None,
+    ) -> Optional[str]:
+        """Update time of the issue, which new comments and edits bump."""
+        if prefetched is not None:
+            return parse_datetime(prefetched["updatedAt"]).isoformat()
+        issue = self.get_repo(repo_name).get_issue(int(issue_number))
+        return issue.updated_at.isoformat()
+
+    def _process_rest(
+        self, repo_name: str, issue_number: str, filters: FilterSet
+    ) -> Iterator[str]:
+        """Fetch the issue through the REST API, one comment page at a time.
+
+        Used when the GraphQL query fails, e.g. for pull request numbers.
+        """
+        repo = self.get_repo(repo_name)
+        issue = repo.get_issue(int(issue_number))
+        yield self._format_header(
+            issue.title,
+            issue.user.login,
+            issue.created_at,
+            issue.state,
+            issue.body,
+            filters,
+        )
+        for comment in issue.get_comments():
+            section = self._format_comment(
+                comment.user.login, comment.created_at, comment.body, filters
+            )
+            tracing.count("issue", "comments")
+            if section:
+                yield section
+
+    def _format_header(
+        self, title, author, created_at, state, body, filters: FilterSet
+    ) -> str:
+        if body and filters.has_line_filter:
+            body = filters.filter_text(body)
+        return "".join(
+            [
+                f"# {title}\n",
+                f"**Author:** {author}  \n",
+                f"**Created:** {created_at}  \n",
+                f"**State:** {state}  \n\n",
+                "## Original Post\n\n",
+                body or "*No description provided*",
+                "\n\n---\n\n",
+                "## Comments\n\n",
+            ]
+        )
+
+    def _format_comment(
+        self, author, created_at, body, filters: FilterSet
+    ) -> Optional[str]:
+        """Format one comment; None when the line filter removed all of it."""
+        if filters.has_line_filter:
+            body = filters.filter_text(body or "")
+            if not body.strip():
+                return None
+        return "".join(
+            [
+                f"### {author} - {created_at}\n\n",
+                f"{body}\n\n",
+                "---\n\n",
+            ]
+        )
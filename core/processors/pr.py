@@ -1,6 +1,18 @@
-import requests
-from typing import Optional, List
+import logging
+from typing import Iterator, Optional, List
+from requests import Response
 from .base import ContentProcessor
+from .. import tracing
+from ..budget import ErrorText
+from ..config import DIFF_CHUNK_BYTES
+from ..filters import FilterSet
+from ..graphql import author_login, parse_datetime
+from ..streaming import LineBuffer
+
+logger = logging.getLogger(__name__)
+
+# Status codes GitHub answers a diff request with when it is too large
+DIFF_TOO_LARGE_STATUSES = (406, 422)
 
 
 class PRProcessor(ContentProcessor):
@@ -12,44 +24,222 @@ class PRProcessor(ContentProcessor):
         keep_matching_files: bool = True,
         line_patterns: Optional[List[str]] = None,
         keep_matching_lines: bool = True,
+        filters: Optional[FilterSet] = None,
+        prefetched: Optional[dict] = None,
+        resolved: Optional[dict] = None,
         **kwargs,
-    ) -> str:
-        """Process a pull request and return its diff."""
+    ) -> Iterator[str]:
+        """Yield a pull request's metadata followed by its diff, file by file.
+
+        The diff is streamed and split on ``diff --git`` headers; file
+        filters drop whole files and line filters apply to the changed and
+        context lines of each hunk. ``prefetched`` holds the pull request
+        fields when they were already fetched in a GraphQL batch with other
+        inputs, and ``resolved`` the pull request ``resolve_version`` looked
+        up. Diffs GitHub refuses to render as a whole are rebuilt from the
+        paginated list of changed files.
+        """
+        if filters is None:
+            filters = FilterSet(
+                file_patterns,
+                keep_matching_files,
+                line_patterns,
+                keep_matching_lines,
+            )
         owner, repo = repo_name.split("/")
-        diff = self._get_pr_diff(owner, repo, pull_number)
+        response = self._open_pr_diff(owner, repo, pull_number)
+        too_large = response.status_code in DIFF_TOO_LARGE_STATUSES
+        if response.status_code != 200 and not too_large:
+            response.close()
+            yield ErrorText(f"Error fetching PR diff: {response.status_code}")
+            return
 
-        if diff.startswith("Error"):
-            return diff
+        try:
+            # Add PR metadata before the diff
+            pr = (resolved or {}).get("pull")
+            if prefetched is not None:
+                # GraphQL reports merged pull requests as MERGED, REST as closed
+                state = prefetched["state"].lower()
+                fields = (
+                    prefetched["title"],
+                    author_login(prefetched),
+                    parse_datetime(prefetched["createdAt"]),
+                    "closed" if state == "merged" else state,
+                    prefetched["baseRefName"],
+                    prefetched["headRefName"],
+                    prefetched["body"],
+                )
+            else:
+                if pr is None:
+                    pr = self.get_repo(repo_name).get_pull(int(pull_number))
+                fields = (
+                    pr.title,
+                    pr.user.login,
+                    pr.created_at,
+                    pr.state,
+                    pr.base.ref,
+                    pr.head.ref,
+                    pr.body,
+                )
+            title, author, created_at, state, base_ref, head_ref, body = fields
+            metadata = [
+                f"# Pull Request #{pull_number}: {title}\n",
+                f"**Author:** {author}  \n",
+                f"**Created:** {created_at}  \n",
+                f"**State:** {state}  \n",
+                f"**Base:** {base_ref} ← **Head:** {head_ref}  \n\n",
+                "## Description\n\n",
+                body or "*No description provided*",
+                "\n\n## Changes\n\n```diff\n",
+            ]
+            yield "".join(metadata)
 
-        # Add PR metadata before the diff
+            if too_large:
+                logger.info(
+                    "Diff of %s#%s is too large, listing changed files "
+                    "instead",
+                    repo_name,
+                    pull_number,
+                )
+                if pr is None:
+                    pr = self.get_repo(repo_name).get_pull(int(pull_number))
+                file_diffs = self._iter_pr_files(pr)
+            else:
+                file_diffs = _split_file_diffs(_iter_lines(response))
+
+            for lines in file_diffs:
+                tracing.count("pr", "files")
+                section = _filter_file_diff(lines, filters)
+                if section is not None:
+                    yield section
+            yield "\n```"
+        finally:
+            response.close()
+
+    def resolve_version(
+        self,
+        repo_name: str,
+        pull_number: str,
+        prefetched: Optional[dict] = None,
+        resolved: Optional[dict] = None,
+    ) -> Optional[str]:
+        """Head commit and update time; comments and edits bump the latter."""
+        if prefetched is not None:
+            updated_at = parse_datetime(prefetched["updatedAt"])
+            return f"{prefetched['headRefOid']}@{updated_at.isoformat()}"
         pr = self.get_repo(repo_name).get_pull(int(pull_number))
-        metadata = [
-            f"# Pull Request #{pull_number}: {pr.title}\n",
-            f"**Author:** {pr.user.login}  \n",
-            f"**Created:** {pr.created_at}  \n",
-            f"**State:** {pr.state}  \n",
-            f"**Base:** {pr.base.ref} ← **Head:** {pr.head.ref}  \n\n",
-            "## Description\n\n",
-            pr.body or "*No description provided*",
-            "\n\n## Changes\n\n```diff\n",
-            diff,
-            "\n```",
-        ]
-
-        return "".join(metadata)
-
-    def _get_pr_diff(self, owner: str, repo: str, pull_number: str) -> str:
-        """Fetch the diff for a pull request."""
-        token = self.github._Github__requester._Requester__auth.token
-        url = (
-            f"https://api.github.com/repos/{owner}/{repo}/pulls/{pull_number}"
-        )
+        if resolved is not None:
+            resolved["pull"] = pr
+        return f"{pr.head.sha}@{pr.updated_at.isoformat()}"
+
+    def _open_pr_diff(
+        self, owner: str, repo: str, pull_number: str
+    ) -> Response:
+        """Start streaming the diff of a pull request; the body is unread."""
+        base_url = self.github.requester.base_url
+        url = f"{base_url}/repos/{owner}/{repo}/pulls/{pull_number}"
         headers = {
-            "Authorization": f"token {token}",
+            **self.auth_headers(),
             "Accept": "application/vnd.github.v3.diff",
         }
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.text
-        else:
-            return f"Error fetching PR diff: {response.status_code}"
+        return self.transport.session.get(url, headers=headers, stream=True)
+
+    def _iter_pr_files(self, pr) -> Iterator[List[str]]:
+        """Rebuild per-file diffs from the paginated ``pulls/{n}/files`` list.
+
+        Files without a patch (binary or very large changes) keep only
+        their header.
+        """
+        for changed in pr.get_files():
+            old_path = changed.previous_filename or changed.filename
+            lines = [f"diff --git a/{old_path} b/{changed.filename}"]
+            if changed.status == "added":
+                lines.append("--- /dev/null")
+            else:
+                lines.append(f"--- a/{old_path}")
+            if changed.status == "removed":
+                lines.append("+++ /dev/null")
+            else:
+                lines.append(f"+++ b/{changed.filename}")
+            if changed.patch:
+                lines.extend(changed.patch.split("\n"))
+            else:
+                lines.append("Binary files or patch too large to display")
+            yield lines
+
+
+def _iter_lines(response: Response) -> Iterator[str]:
+    """Yield the lines of a streamed response without their newlines."""
+    if response.encoding is None:
+        response.encoding = "utf-8"
+    pending = LineBuffer()
+    for chunk in response.iter_content(DIFF_CHUNK_BYTES, decode_unicode=True):
+        yield from pending.feed(chunk)
+    if pending.size:
+        yield pending.finish()
+
+
+def _split_file_diffs(lines: Iterator[str]) -> Iterator[List[str]]:
+    """Group diff lines into one list per file, split on ``diff --git``."""
+    current = []
+    for line in lines:
+        if line.startswith("diff --git ") and current:
+            yield current
+            current = []
+        current.append(line)
+    if current:
+        yield current
+
+
+def _diff_path(lines: List[str]) -> str:
+    """Path of the file a diff section changes (the old path if deleted)."""
+    old_path = None
+    for line in lines:
+        if line.startswith("+++ ") and line != "+++ /dev/null":
+            return line[6:] if line.startswith("+++ b/") else line[4:]
+        if line.startswith("--- ") and line != "--- /dev/null":
+            old_path = line[6:] if line.startswith("--- a/") else line[4:]
+        elif line.startswith("rename to "):
+            return line[10:]
+        elif line.startswith("@@"):
+            break
+    if old_path is not None:
+        return old_path
+    # No ---/+++ lines (e.g. mode changes, binary files): use the header
+    header = lines[0]
+    if " b/" in header:
+        return header.rsplit(" b/", 1)[1]
+    return header
+
+
+def _filter_file_diff(lines: List[str], filters: FilterSet) -> Optional[str]:
+    """Apply the file and line filters to the diff of a single file.
+
+    File headers and ``@@`` hunk headers are always kept; line filters are
+    matched against the changed and context lines without their ``+``,
+    ``-`` or space prefix. Returns None when the file is filtered out,
+    including when no changed line passes the line filter.
+    """
+    if lines[0].startswith("diff --git ") and not filters.include_path(
+        _diff_path(lines)
+    ):
+        return None
+
+    if filters.has_line_filter:
+        kept = []
+        changes = 0
+        in_hunk = False
+        for line in lines:
+            if line.startswith("@@"):
+                in_hunk = True
+            elif in_hunk and line[:1] in ("+", "-", " "):
+                if not filters.include_line(line[1:]):
+                    continue
+                if line[:1] != " ":
+                    changes += 1  # Context lines alone do not keep a file
+            kept.append(line)
+        if not changes:
+            return None
+        lines = kept
+
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,87 @@
+import logging
+import queue
 import re
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Pattern
+from github import Github
+from github.Repository import Repository
 from .base import ContentProcessor
 from .repo import RepoProcessor
+from .. import tracing
+from ..budget import ErrorText, OutputBudget
+from ..config import (
+    REGEX_INCLUDE_ARCHIVED,
+    REGEX_INCLUDE_FORKS,
+    REGEX_LANGUAGES,
+    REGEX_LOOKAHEAD_CHUNKS,
+    REGEX_MAX_MATCHES,
+    REGEX_MAX_OUTPUT_BYTES,
+    REGEX_MAX_REPO_SIZE_KB,
+    REGEX_OWNERS,
+    REGEX_REPO_CONCURRENCY,
+)
+from ..filters import FilterSet
+from ..path_index import PathIndex, get_default_path_index
+from ..transport import Transport
+from ..tree import get_manifest
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # End of a repository's sections
+
+
+@dataclass
+class RepoSelection:
+    """Metadata filters deciding which repositories a regex search visits.
+
+    Repositories are pruned from the listing alone, before any of their
+    trees are read. Empty repositories are always skipped.
+    """
+
+    include_forks: bool = REGEX_INCLUDE_FORKS
+    include_archived: bool = REGEX_INCLUDE_ARCHIVED
+    max_size_kb: Optional[int] = REGEX_MAX_REPO_SIZE_KB
+    languages: Optional[List[str]] = REGEX_LANGUAGES
+    owners: Optional[List[str]] = REGEX_OWNERS
+
+    def accepts(self, repo: Repository) -> bool:
+        if not repo.size:
+            return False  # Empty repository (or nothing pushed yet)
+        if repo.fork and not self.include_forks:
+            return False
+        if repo.archived and not self.include_archived:
+            return False
+        if self.max_size_kb is not None and repo.size > self.max_size_kb:
+            return False
+        if self.languages and (repo.language or "").lower() not in {
+            language.lower() for language in self.languages
+        }:
+            return False
+        if self.owners and repo.owner.login.lower() not in {
+            owner.lower() for owner in self.owners
+        }:
+            return False
+        return True
 
 
 class RegexProcessor(ContentProcessor):
+    def __init__(
+        self,
+        github_client: Github,
+        transport: Optional[Transport] = None,
+        repo_processor: Optional[RepoProcessor] = None,
+        path_index: Optional[PathIndex] = None,
+    ):
+        super().__init__(github_client, transport)
+        self.repo_processor = repo_processor or RepoProcessor(
+            github_client, transport=self.transport
+        )
+        self.path_index = (
+            path_index if path_index is not None else get_default_path_index()
+        )
+
     def process(
         self,
         repo_name: None,
@@ -13,50 +90,176 @@ class RegexProcessor(ContentProcessor):
         keep_matching_files: bool = True,
         line_patterns: Optional[List[str]] = None,
         keep_matching_lines: bool = True,
+        filters: Optional[FilterSet] = None,
+        selection: Optional[RepoSelection] = None,
+        max_matches: Optional[int] = REGEX_MAX_MATCHES,
+        max_output_bytes: Optional[int] = REGEX_MAX_OUTPUT_BYTES,
+        budget: Optional[OutputBudget] = None,
         **kwargs,
-    ) -> str:
-        """Process content matching regex pattern across user's repositories."""
-        repo_processor = RepoProcessor(self.github)
-        results = []
+    ) -> Iterator[str]:
+        """Yield content matching regex pattern across user's repositories.
 
-        # Search through all user's repositories
-        for repo in self.github.get_user().get_repos():
+        Repositories passing ``selection`` are scanned concurrently and
+        their output is emitted in listing order, each scan running at
+        most ``REGEX_LOOKAHEAD_CHUNKS`` chunks ahead of the output. Paths
+        are looked up in the local path index, which lists a repository's
+        tree again only after a new push; without the index every
+        repository's tree is listed. The search stops once ``max_matches``
+        files or ``max_output_bytes`` bytes of output have been emitted.
+        """
+        if filters is None:
+            filters = FilterSet(
+                file_patterns,
+                keep_matching_files,
+                line_patterns,
+                keep_matching_lines,
+            )
+        if selection is None:
+            selection = RepoSelection()
+        path_regex = re.compile(pattern)
+        stop = threading.Event()
+
+        repos = [
+            repo
+            for repo in self.github.get_user().get_repos()
+            if selection.accepts(repo)
+        ]
+        logger.debug("Searching %d repositories", len(repos))
+
+        def scan(repo: Repository, sink: queue.Queue) -> None:
+            sections = self._scan_repo(repo, path_regex, filters, budget)
             try:
-                # Get root contents
-                contents = repo.get_contents("", ref=repo.default_branch)
-
-                # Filter contents by regex pattern
-                matching_contents = []
-                while contents:
-                    content = contents.pop(0)
-                    if content.type == "dir":
-                        contents.extend(
-                            repo.get_contents(
-                                content.path, ref=repo.default_branch
-                            )
-                        )
-                    elif re.match(pattern, content.path):
-                        matching_contents.append(content)
-
-                # Process matching contents
-                if matching_contents:
-                    content = repo_processor._process_contents(
-                        repo,
-                        matching_contents,
-                        repo.default_branch,
-                        file_patterns,
-                        keep_matching_files,
-                        line_patterns,
-                        keep_matching_lines,
-                    )
-                    if content:
-                        results.extend(
-                            [f"\n### Repository: {repo.full_name}\n", content]
+                for section in sections:
+                    if not _offer(sink, section, stop):
+                        return
+            except Exception as e:
+                _offer(sink, e, stop)
+            finally:
+                sections.close()
+                _offer(sink, _DONE, stop)
+
+        found = False
+        matches = 0
+        output_bytes = 0
+        sinks = [queue.Queue(maxsize=REGEX_LOOKAHEAD_CHUNKS) for _ in repos]
+        executor = ThreadPoolExecutor(max_workers=REGEX_REPO_CONCURRENCY)
+        try:
+            for repo, sink in zip(repos, sinks):
+                executor.submit(tracing.bind(scan), repo, sink)
+
+            for repo, sink in zip(repos, sinks):
+                header = f"\n### Repository: {repo.full_name}\n"
+                file_list = None
+                path = None
+                while True:
+                    section = sink.get()
+                    if section is _DONE:
+                        break
+                    if isinstance(section, Exception):
+                        found = True
+                        yield ErrorText(
+                            f"\nError processing {repo.full_name}: "
+                            f"{str(section)}\n"
                         )
+                        continue
+                    if not section:
+                        file_list = section  # Announced by a budget
+                        continue
+                    # Sections are chunks of files; count each file once
+                    section_path = getattr(section, "path", None)
+                    if path is None or section_path != path:
+                        if _budget_reached(
+                            matches,
+                            max_matches,
+                            output_bytes,
+                            max_output_bytes,
+                        ):
+                            yield _stopped(matches)
+                            return
+                        matches += 1
+                        path = section_path
+
+                    # Process matching contents, headed by the repository name
+                    if header is not None:
+                        found = True
+                        yield header
+                        header = None
+                    if file_list is not None:
+                        yield file_list
+                        file_list = None
+                    yield section
+                    output_bytes += len(section.encode("utf-8"))
+                    if (
+                        max_output_bytes is not None
+                        and output_bytes >= max_output_bytes
+                    ):
+                        yield _stopped(matches)
+                        return
+                if _budget_reached(
+                    matches, max_matches, output_bytes, max_output_bytes
+                ):
+                    if repo is not repos[-1]:
+                        yield _stopped(matches)
+                    return
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if not found:
+            yield "No matching files found."
+
+    def _scan_repo(
+        self,
+        repo: Repository,
+        path_regex: Pattern,
+        filters: FilterSet,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[str]:
+        """Yield the sections of the files of one repository that match."""
+        if self.path_index is not None:
+            commit_sha, matching_contents = self.path_index.match(
+                repo, path_regex
+            )
+        else:
+            # List the whole tree in one request and filter by regex
+            commit_sha, entries = get_manifest(repo, repo.default_branch)
+            matching_contents = [
+                entry for entry in entries if path_regex.match(entry.path)
+            ]
+        yield from self.repo_processor._process_contents(
+            repo,
+            matching_contents,
+            repo.default_branch,
+            filters,
+            commit_sha=commit_sha,
+            budget=budget,
+        )
+
+
+def _offer(sink: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put ``item`` on ``sink`` once there is room; False once stopped."""
+    while not stop.is_set():
+        try:
+            sink.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stopped(matches: int) -> str:
+    return (
+        f"\nSearch stopped after {matches} matching files "
+        "(budget reached).\n"
+    )
 
-            except Exception as e:
-                results.append(
-                    f"\nError processing {repo.full_name}: {str(e)}\n"
-                )
 
-        return "".join(results) if results else "No matching files found."
+def _budget_reached(
+    matches: int,
+    max_matches: Optional[int],
+    output_bytes: int,
+    max_output_bytes: Optional[int],
+) -> bool:
+    if max_matches is not None and matches >= max_matches:
+        return True
+    return max_output_bytes is not None and output_bytes >= max_output_bytes
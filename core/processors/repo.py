@@ -1,13 +1,80 @@
-from typing import List, Union, Optional
+import logging
+from dataclasses import replace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 import urllib.parse
 from github import Github
-from github.ContentFile import ContentFile
 from github.Repository import Repository
 from .base import ContentProcessor
-from ..config import GITHUB_MAX_FILE_SIZE, BINARY_FILE_EXTENSIONS
+from ..blob_cache import BlobCache, get_default_blob_cache
+from .. import tracing
+from ..budget import (
+    ErrorText,
+    FileList,
+    FileSection,
+    OutputBudget,
+    is_error,
+)
+from ..archive import iter_archive
+from ..classify import (
+    BINARY,
+    GENERATED,
+    LARGE,
+    UNKNOWN,
+    classify_path,
+    looks_binary,
+    sniff,
+)
+from ..config import (
+    ARCHIVE_BUFFER_BYTES,
+    ARCHIVE_ENABLED,
+    ARCHIVE_MIN_FRACTION,
+    ARCHIVE_THRESHOLD_FILES,
+    GITHUB_MAX_FILE_SIZE,
+    GRAPHQL_BATCH_MAX_BYTES,
+    GRAPHQL_BATCH_MAX_FILES,
+    GRAPHQL_BLOBS_ENABLED,
+    GRAPHQL_MIN_BATCH,
+    LARGE_FILE_MAX_BYTES,
+    LARGE_FILE_MAX_LINES,
+    LARGE_FILES_ENABLED,
+    OUTPUT_LOOKAHEAD_UNITS,
+    SKIP_GENERATED_FILES,
+    SNIFF_BYTES,
+    SNIFF_MIN_BYTES,
+    STREAM_CHUNK_BYTES,
+)
+from ..fetcher import fetch_ordered
+from ..filters import FilterSet
+from ..graphql import fetch_blobs
+from ..mirror import MIRROR, GitMirror, get_mirror, repo_backend
+from ..planner import InputBlobs, RepoPlan
+from ..snapshots import SnapshotStore, get_default_snapshot_store
+from ..streaming import BinaryContentError, stream_text
+from ..transport import Transport
+from ..tree import TreeEntry, list_blobs, resolve_ref
+
+logger = logging.getLogger(__name__)
+
+_STREAMED = object()  # Content of a large file, streamed by the consumer
 
 
 class RepoProcessor(ContentProcessor):
+    def __init__(
+        self,
+        github_client: Github,
+        blob_cache: Optional[BlobCache] = None,
+        transport: Optional[Transport] = None,
+        snapshots: Optional[SnapshotStore] = None,
+    ):
+        super().__init__(github_client, transport)
+        self.blob_cache = (
+            blob_cache if blob_cache is not None else get_default_blob_cache()
+        )
+        if snapshots is None:
+            snapshots = get_default_snapshot_store()
+        self.snapshots = snapshots
+        self._sniffed = {}  # blob SHA -> whether its first bytes look binary
+
     def process(
         self,
         repo_name: str,
@@ -16,174 +83,787 @@ class RepoProcessor(ContentProcessor):
         keep_matching_files: bool = True,
         line_patterns: Optional[List[str]] = None,
         keep_matching_lines: bool = True,
+        filters: Optional[FilterSet] = None,
+        planned: Optional[RepoPlan] = None,
+        shared: Optional[InputBlobs] = None,
+        budget: Optional[OutputBudget] = None,
+        resolved: Optional[dict] = None,
         **kwargs,
-    ) -> str:
-        """Process repository contents with file and line filtering."""
+    ) -> Iterator[str]:
+        """Yield repository contents with file and line filtering.
+
+        Repositories configured for the mirror backend are read from a
+        local clone instead of the API. ``planned`` holds the repository
+        and manifest when the stitch planner already resolved them, and
+        ``shared`` the blobs this input shares with other inputs.
+        ``resolved`` holds what ``resolve_version`` looked up. With a
+        ``budget``, files come in priority order and each is capped.
+        """
+        resolved = resolved or {}
+        if filters is None:
+            filters = FilterSet(
+                file_patterns,
+                keep_matching_files,
+                line_patterns,
+                keep_matching_lines,
+            )
         try:
-            print(f"\nDEBUG: Processing repository: {repo_name}")
-            print(f"DEBUG: Extra info: {extra_info}")
+            if repo_backend(repo_name) == MIRROR:
+                mirror = resolved.get("mirror") or self._get_mirror(
+                    repo_name
+                )
+                yield from self._process_mirror(
+                    mirror, extra_info, filters, budget
+                )
+                return
 
-            repo = self.get_repo(repo_name)
-            print(f"DEBUG: Default branch: {repo.default_branch}")
+            logger.debug(
+                "Processing repository %s (%r)", repo_name, extra_info
+            )
+
+            if planned is not None:
+                repo = planned.repo
+            else:
+                repo = resolved.get("repo") or self.get_repo(repo_name)
 
             # Handle different input types
+            path = ""
             if isinstance(extra_info, tuple):
                 path, branch = extra_info
-                print(f"DEBUG: Raw path: '{path}', branch: '{branch}'")
 
                 if branch:
                     # Don't URL encode the branch name yet
-                    print(f"DEBUG: Using specified branch: '{branch}'")
+                    logger.debug("Using specified branch: %r", branch)
                 else:
                     branch = repo.default_branch
-                    print(f"DEBUG: Using default branch: '{branch}'")
-
-                try:
-                    if path:
-                        print(
-                            f"DEBUG: Fetching specific path: '{path}' from branch: '{branch}'"
-                        )
-                        contents = repo.get_contents(path, ref=branch)
-                    else:
-                        print(
-                            f"DEBUG: Fetching root contents from branch: '{branch}'"
-                        )
-                        contents = repo.get_contents("", ref=branch)
-                    print("DEBUG: Successfully fetched contents")
-
-                except Exception as e:
-                    error_msg = f"Error fetching content from branch '{branch}': {str(e)}"
-                    print(f"DEBUG: {error_msg}")
-                    return error_msg
+                    logger.debug("Using default branch: %r", branch)
             else:
                 branch = repo.default_branch
-                print(
-                    f"DEBUG: Using default branch (no extra info): '{branch}'"
-                )
-                contents = repo.get_contents("", ref=branch)
+                logger.debug("Using default branch: %r", branch)
 
-            return self._process_contents(
+            try:
+                logger.debug("Listing tree for %r at %r", path, branch)
+                if planned is not None:
+                    commit_sha, entries = planned.commit_sha, planned.entries
+                else:
+                    commit_sha, entries = self._get_manifest(
+                        repo, branch, path, resolved.get("commits", {})
+                    )
+                if path and not entries:
+                    raise FileNotFoundError(f"path '{path}' not found")
+                logger.debug("Manifest contains %d files", len(entries))
+
+            except Exception as e:
+                error_msg = f"Error fetching content from branch '{branch}': {str(e)}"
+                logger.warning(error_msg)
+                yield ErrorText(error_msg)
+                return
+
+            yield from self._process_contents(
                 repo,
-                contents,
+                _mark_named(entries, path),
                 branch,
-                file_patterns,
-                keep_matching_files,
-                line_patterns,
-                keep_matching_lines,
+                filters,
+                commit_sha=commit_sha,
+                shared=shared,
+                budget=budget,
             )
 
         except Exception as e:
             error_msg = f"Error processing repository: {str(e)}"
-            print(f"DEBUG: {error_msg}")
-            return error_msg
+            logger.warning(error_msg)
+            yield ErrorText(error_msg)
+
+    def resolve_version(
+        self,
+        repo_name: str,
+        extra_info: Optional[Union[str, tuple]],
+        prefetched: Optional[dict] = None,
+        resolved: Optional[dict] = None,
+    ) -> Optional[str]:
+        """Commit SHA the input's branch, tag or SHA points at.
+
+        ``resolved`` keeps the mirror, or the repository and the resolved
+        ``{ref: (commit SHA, tree SHA)}``, for ``process``.
+        """
+        if resolved is None:
+            resolved = {}
+        branch = extra_info[1] if isinstance(extra_info, tuple) else ""
+        if repo_backend(repo_name) == MIRROR:
+            mirror = resolved["mirror"] = self._get_mirror(repo_name)
+            mirror.update()
+            return mirror.resolve(branch or mirror.default_branch())[0]
+        repo = resolved["repo"] = self.get_repo(repo_name)
+        ref = branch or repo.default_branch
+        commit = resolve_ref(repo, ref)
+        resolved["commits"] = {ref: commit}
+        return commit[0]
+
+    def _get_mirror(self, repo_name: str) -> GitMirror:
+        """Mirror of a repository, once this token's access is confirmed."""
+        return get_mirror(
+            repo_name,
+            self.auth_headers(),
+            check_access=lambda: self.get_repo(repo_name),
+        )
+
+    def _process_mirror(
+        self,
+        mirror: GitMirror,
+        extra_info: Optional[Union[str, tuple]],
+        filters: FilterSet,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[str]:
+        """Yield repository contents read from a local mirror.
+
+        The output matches the API path. Refs and trees are read from the
+        clone, missing blobs are fetched in one round trip and all files
+        come from a single ``git cat-file --batch``.
+        """
+        path, branch = "", ""
+        if isinstance(extra_info, tuple):
+            path, branch = extra_info
+        try:
+            mirror.update()
+            branch = branch or mirror.default_branch()
+            logger.debug("Reading %r at %r from mirror", path, branch)
+            commit_sha, tree_sha = mirror.resolve(branch)
+            entries = _mark_named(mirror.list_blobs(tree_sha, path), path)
+            if path and not entries:
+                raise FileNotFoundError(f"path '{path}' not found")
+            logger.debug("Manifest contains %d files", len(entries))
+        except Exception as e:
+            error_msg = (
+                f"Error fetching content from branch '{branch}': {str(e)}"
+            )
+            logger.warning(error_msg)
+            yield ErrorText(error_msg)
+            return
+
+        entries = _ordered(entries, filters, budget)
+        if budget is not None:
+            yield FileList([entry.path for entry in entries])
+        reads = [
+            entry for entry in entries if self._skip_reason(entry) is None
+        ]
+        mirror.prefetch(tree_sha, [entry.sha for entry in reads])
+        blobs = mirror.iter_blobs([entry.sha for entry in reads])
+        try:
+            for entry in entries:
+                skip_reason = self._skip_reason(entry)
+                if skip_reason is not None:
+                    yield _file_section(entry, skip_reason, budget)
+                    continue
+                _, size, chunks = next(blobs)
+                content = self._read_mirror_blob(entry, size, chunks, filters)
+                if budget is not None:
+                    content = budget.cap_blocks(content)
+                yield from _section(entry, content)
+        finally:
+            blobs.close()
+
+    def _read_mirror_blob(
+        self,
+        entry: TreeEntry,
+        size: Optional[int],
+        chunks: Iterator[bytes],
+        filters: FilterSet,
+    ) -> Iterator[str]:
+        """Yield the content of a blob read from a mirror."""
+        if size is None:
+            yield ErrorText(
+                f"Error: Could not fetch content for {entry.path}. missing"
+            )
+            return
+        entry = replace(entry, size=size)
+        try:
+            if self._is_large(entry):
+                yield from stream_text(
+                    chunks, filters, LARGE_FILE_MAX_BYTES, LARGE_FILE_MAX_LINES
+                )
+                return
+            if _classify(entry)[0] == LARGE:
+                yield f"File is too large to display (size: {size} bytes)"
+                return
+            data = b"".join(chunks)
+        except BinaryContentError:
+            yield f"[Binary file: {entry.path}]"
+            return
+        if looks_binary(data[:SNIFF_BYTES]):
+            yield f"[Binary file: {entry.path}]"
+            return
+        yield filters.filter_text(data.decode("utf-8", errors="replace"))
+
+    def _get_manifest(
+        self,
+        repo: Repository,
+        ref: str,
+        path: str = "",
+        commits: Optional[Dict[str, Tuple[str, str]]] = None,
+    ) -> Tuple[str, List[TreeEntry]]:
+        """Resolve ``ref`` and list the blobs under ``path`` incrementally.
+
+        Each stitch records its manifest. If ``ref`` still points at the
+        recorded commit, the stored manifest is reused without listing the
+        tree; all of its blobs are then served from the blob cache. If it
+        moved, only files whose blob SHA changed miss the cache. ``commits``
+        maps refs already resolved to their (commit SHA, tree SHA).
+        """
+        commit = (commits or {}).get(ref)
+        if commit is None:
+            commit = resolve_ref(repo, ref)
+        commit_sha, tree_sha = commit
+        if self.snapshots is None or self.blob_cache is None:
+            return commit_sha, list_blobs(repo, tree_sha, path)
+
+        previous = self.snapshots.get(repo.full_name, ref, path)
+        if previous is not None and previous[0] == commit_sha:
+            logger.debug("%r unchanged at %s", ref, commit_sha[:7])
+            return previous
+
+        # Blobs left unchanged keep their SHA, so only changed ones miss
+        # the blob cache
+        entries = list_blobs(repo, tree_sha, path)
+        self.snapshots.put(repo.full_name, ref, path, commit_sha, entries)
+        return commit_sha, entries
 
     def _process_contents(
         self,
         repo: Repository,
-        contents: Union[List[ContentFile], ContentFile],
+        entries: List[TreeEntry],
         branch: str,
-        file_patterns: Optional[List[str]],
-        keep_matching_files: bool,
-        line_patterns: Optional[List[str]],
-        keep_matching_lines: bool,
-    ) -> str:
-        """Process list of content files recursively."""
-        print(f"\nDEBUG: Processing contents for branch: '{branch}'")
-
-        result = []
-        if not isinstance(contents, list):
-            contents = [contents]
-
-        while contents:
-            content = contents.pop(0)
-            try:
-                print(f"\nDEBUG: Processing content: {content.path}")
-
-                # Handle directories recursively
-                if content.type == "dir":
-                    print(f"DEBUG: Found directory: {content.path}")
-                    dir_contents = repo.get_contents(content.path, ref=branch)
-                    if isinstance(dir_contents, list):
-                        contents.extend(dir_contents)
-                    else:
-                        contents.append(dir_contents)
-                    continue
+        filters: FilterSet,
+        commit_sha: Optional[str] = None,
+        shared: Optional[InputBlobs] = None,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[str]:
+        """Fetch the files of a tree manifest concurrently, in path order.
 
-                # Process the file
-                file_content = self._get_file_content(
-                    repo, content, branch, line_patterns, keep_matching_lines
-                )
+        The path filter is applied to the manifest, so excluded files are
+        never downloaded, and files are classified from their path and size
+        so binary, generated and oversized ones are never downloaded
+        either. Large manifests are read from a single streamed tarball of
+        the commit; otherwise large files of unknown type are sniffed first,
+        small files are fetched in GraphQL batches and the rest one request
+        per blob. Files over ``GITHUB_MAX_FILE_SIZE`` are streamed in
+        order, one at a time, in constant memory. Files are fetched only a
+        little ahead of the consumer, so closing the output early cancels
+        the rest. With a ``budget``, the file list is announced first.
+        """
+        logger.debug("Processing contents for branch: %r", branch)
+
+        def fetch(entry: TreeEntry) -> Optional[str]:
+            logger.debug("Processing content: %s", entry.path)
+            return self._get_file_content(
+                repo, entry, branch, filters, shared=shared
+            )
 
-                if file_content:
-                    result.extend(
-                        [f"\n--- {content.path} ---\n\n", file_content, "\n"]
+        entries = _ordered(entries, filters, budget)
+        if budget is not None:
+            yield FileList([entry.path for entry in entries])
+        if self._should_use_archive(repo, entries, shared):
+            logger.debug("Streaming tarball for %d files", len(entries))
+            results = self._fetch_from_archive(
+                repo, entries, commit_sha or branch, fetch, filters, shared
+            )
+        else:
+            self._sniff_unknown(repo, entries, commit_sha or branch)
+            results = self._fetch_batched(
+                repo, entries, branch, filters, shared, budget
+            )
+
+        try:
+            for entry, file_content, error in results:
+                if error is not None:
+                    error_msg = (
+                        f"\nError processing {entry.path}: {str(error)}\n"
                     )
+                    logger.warning(error_msg.strip())
+                    tracing.count("repo", "file_errors")
+                    yield FileSection(error_msg, entry.path, is_error=True)
+                elif file_content is _STREAMED:
+                    tracing.count("repo", "streamed_files")
+                    blocks = self._stream_large_file(repo, entry, filters)
+                    if budget is not None:
+                        blocks = budget.cap_blocks(blocks)
+                    yield from _section(entry, blocks)
+                elif file_content:
+                    tracing.count("repo", "files")
+                    yield _file_section(entry, file_content, budget)
+        finally:
+            results.close()
 
-            except Exception as e:
-                error_msg = f"\nError processing {content.path}: {str(e)}\n"
-                print(f"DEBUG: {error_msg}")
-                result.append(error_msg)
+    def _needs_download(
+        self, entry: TreeEntry, shared: Optional[InputBlobs] = None
+    ) -> bool:
+        return (
+            self._skip_reason(entry) is None
+            and not self._is_large(entry)
+            and not (shared is not None and shared.waits_for(entry.sha))
+            and (self.blob_cache is None or entry.sha not in self.blob_cache)
+        )
 
-        return "".join(result)
+    def _is_large(self, entry: TreeEntry) -> bool:
+        return (
+            LARGE_FILES_ENABLED
+            and _classify(entry)[0] == LARGE
+        )
+
+    def _stream_large_file(
+        self, repo: Repository, entry: TreeEntry, filters: FilterSet
+    ) -> Iterator[str]:
+        """Yield a large file in blocks from the raw Git Blobs API.
+
+        Nothing is cached and at most one block is held in memory; reading
+        stops at ``LARGE_FILE_MAX_BYTES`` / ``LARGE_FILE_MAX_LINES``.
+        """
+        logger.debug(
+            "Streaming large file %s (%d bytes)", entry.path, entry.size
+        )
+        headers = {
+            **self.auth_headers(),
+            "Accept": "application/vnd.github.raw",
+        }
+        url = f"{repo.url}/git/blobs/{entry.sha}"
+        try:
+            with self.transport.session.get(
+                url, headers=headers, stream=True
+            ) as response:
+                response.raise_for_status()
+                yield from stream_text(
+                    response.iter_content(STREAM_CHUNK_BYTES),
+                    filters,
+                    LARGE_FILE_MAX_BYTES,
+                    LARGE_FILE_MAX_LINES,
+                )
+        except BinaryContentError:
+            yield f"[Binary file: {entry.path}]"
+        except Exception as e:
+            yield ErrorText(
+                f"\nError: Could not fetch content for {entry.path}. {str(e)}"
+            )
+
+    def _should_use_archive(
+        self,
+        repo: Repository,
+        entries: List[TreeEntry],
+        shared: Optional[InputBlobs] = None,
+    ) -> bool:
+        """Use the tarball once enough of the repository needs a download.
+
+        The tarball holds the whole repository, so besides more than
+        ``ARCHIVE_THRESHOLD_FILES`` files, the files to download must add
+        up to ``ARCHIVE_MIN_FRACTION`` of the repository's size.
+        """
+        if not ARCHIVE_ENABLED:
+            return False
+        uncached = [
+            entry for entry in entries if self._needs_download(entry, shared)
+        ]
+        if len(uncached) <= ARCHIVE_THRESHOLD_FILES:
+            return False
+        repo_bytes = (repo.size or 0) * 1024  # GitHub reports KB
+        wanted_bytes = sum(entry.size for entry in uncached)
+        return wanted_bytes >= ARCHIVE_MIN_FRACTION * repo_bytes
+
+    def _sniff_unknown(
+        self, repo: Repository, entries: List[TreeEntry], ref: str
+    ) -> None:
+        """Read the first bytes of large files of unknown type.
+
+        Files of at least ``SNIFF_MIN_BYTES`` whose path does not tell text
+        from binary get a ranged raw request, so binary ones are skipped
+        without a full download. Smaller files cost about as much to sniff
+        as to fetch.
+        """
+        candidates = [
+            entry
+            for entry in entries
+            if entry.size >= SNIFF_MIN_BYTES
+            and entry.sha not in self._sniffed
+            and _classify(entry)[0] == UNKNOWN
+            and (self.blob_cache is None or entry.sha not in self.blob_cache)
+        ]
+        if not candidates:
+            return
+
+        headers = {
+            **self.auth_headers(),
+            "Accept": "application/vnd.github.raw",
+        }
+
+        def sniff_entry(entry: TreeEntry) -> bytes:
+            url = (
+                f"{repo.url}/contents/{urllib.parse.quote(entry.path)}"
+                f"?ref={urllib.parse.quote(ref, safe='')}"
+            )
+            return sniff(self.transport.session, url, headers)
+
+        logger.debug("Sniffing %d files of unknown type", len(candidates))
+        for entry, sample, error in fetch_ordered(sniff_entry, candidates):
+            if error is not None:
+                logger.debug("Could not sniff %s: %s", entry.path, error)
+                continue
+            self._sniffed[entry.sha] = looks_binary(sample)
+
+    def _fetch_batched(
+        self,
+        repo: Repository,
+        entries: List[TreeEntry],
+        branch: str,
+        filters: FilterSet,
+        shared: Optional[InputBlobs] = None,
+        budget: Optional[OutputBudget] = None,
+    ) -> Iterator[Tuple[TreeEntry, Optional[str], Optional[Exception]]]:
+        """Yield ``(entry, content, error)`` fetching blobs in GraphQL batches.
+
+        Entries are cut into consecutive units holding at most
+        ``GRAPHQL_BATCH_MAX_FILES`` downloads and ``GRAPHQL_BATCH_MAX_BYTES``
+        of blob data. Units run concurrently and each needs one GraphQL
+        query; blobs the query could not return fall back to the REST API.
+        With a ``budget``, units are cut as the consumer reaches them, hold
+        no more blob data than the budget has room for, and only
+        ``OUTPUT_LOOKAHEAD_UNITS`` of them are fetched ahead.
+        """
+
+        def max_unit_bytes() -> int:
+            left = budget.remaining_bytes() if budget is not None else None
+            if left is None:
+                return GRAPHQL_BATCH_MAX_BYTES
+            return min(left, GRAPHQL_BATCH_MAX_BYTES)
+
+        def cut_units() -> Iterator[List[TreeEntry]]:
+            if not GRAPHQL_BLOBS_ENABLED:
+                yield from ([entry] for entry in entries)
+                return
+            unit = []
+            downloads = 0
+            unit_bytes = 0
+            max_bytes = max_unit_bytes()
+            for entry in entries:
+                needs_download = self._needs_download(entry, shared)
+                if needs_download and downloads and (
+                    downloads >= GRAPHQL_BATCH_MAX_FILES
+                    or unit_bytes + entry.size > max_bytes
+                ):
+                    yield unit
+                    unit, downloads, unit_bytes = [], 0, 0
+                    max_bytes = max_unit_bytes()
+                unit.append(entry)
+                if needs_download:
+                    downloads += 1
+                    unit_bytes += entry.size
+            if unit:
+                yield unit
+
+        def fetch_unit(unit: List[TreeEntry]) -> List[Optional[str]]:
+            blobs = {}
+            downloads = [
+                entry
+                for entry in unit
+                if self._needs_download(entry, shared)
+            ]
+            if len(downloads) >= GRAPHQL_MIN_BATCH:
+                try:
+                    blobs = fetch_blobs(self.github, repo, downloads)
+                except Exception as e:
+                    logger.warning("GraphQL blob batch failed: %s", e)
+            return [
+                self._get_file_content(
+                    repo, entry, branch, filters, blobs, shared
+                )
+                for entry in unit
+            ]
+
+        if budget is None:
+            results = fetch_ordered(fetch_unit, cut_units())
+        else:
+            results = fetch_ordered(
+                fetch_unit,
+                cut_units(),
+                max_workers=OUTPUT_LOOKAHEAD_UNITS,
+                lookahead=OUTPUT_LOOKAHEAD_UNITS,
+            )
+        for unit, contents, error in results:
+            if error is not None:
+                for entry in unit:
+                    yield entry, None, error
+                continue
+            for entry, file_content in zip(unit, contents):
+                yield entry, file_content, None
+
+    def _fetch_from_archive(
+        self,
+        repo: Repository,
+        entries: List[TreeEntry],
+        ref: str,
+        fetch: Callable[[TreeEntry], Optional[str]],
+        filters: FilterSet,
+        shared: Optional[InputBlobs] = None,
+    ) -> Iterator[Tuple[TreeEntry, Optional[str], Optional[Exception]]]:
+        """Yield ``(entry, content, error)`` using a streamed tarball.
+
+        Entries that are cached, skipped or missing from the archive (such
+        as symlinks) go through the regular per-file path. If the stream
+        fails, the remaining entries are fetched per file as well.
+
+        Members arrive in path order. Those read ahead of their entry,
+        as under a budget's priority order, are moved to the blob cache;
+        without one they are held up to ``ARCHIVE_BUFFER_BYTES`` and the
+        rest are fetched per file.
+        """
+        wanted = {
+            entry.path
+            for entry in entries
+            if self._needs_download(entry, shared)
+        }
+        by_path = {entry.path: entry for entry in entries}
+        members = iter_archive(
+            self.transport.session,
+            f"{repo.url}/tarball/{ref}",
+            self.auth_headers(),
+            wanted,
+        )
+        held = {}  # Members read ahead of their entry
+        held_bytes = 0
+
+        try:
+            for index, entry in enumerate(entries):
+                data = held.pop(entry.path, None)
+                if data is not None:
+                    held_bytes -= len(data)
+                try:
+                    while data is None and entry.path in wanted:
+                        path, member_data = next(members)
+                        if path == entry.path:
+                            data = member_data
+                        elif self.blob_cache is not None:
+                            wanted.discard(path)  # Read back from the cache
+                            self._keep_blob(by_path[path], member_data)
+                        elif (
+                            held_bytes + len(member_data)
+                            <= ARCHIVE_BUFFER_BYTES
+                        ):
+                            held[path] = member_data
+                            held_bytes += len(member_data)
+                        else:
+                            wanted.discard(path)  # Fetched per file later
+                except StopIteration:
+                    wanted = set()  # Archive exhausted; rest go per file
+                except Exception as e:
+                    logger.warning("Archive stream failed: %s", e)
+                    yield from fetch_ordered(fetch, entries[index:])
+                    return
+
+                if data is None:
+                    yield entry, fetch(entry), None
+                    continue
+
+                text = self._keep_blob(entry, data)
+                if text is None:
+                    if shared is not None:
+                        shared.release(entry.sha)
+                    yield entry, self._skip_reason(entry), None
+                    continue
+                if shared is not None:
+                    shared.put(entry.sha, text)
+                yield entry, filters.filter_text(text), None
+        finally:
+            members.close()
+
+    def _keep_blob(self, entry: TreeEntry, data: bytes) -> Optional[str]:
+        """Decode and cache a downloaded blob; None if it is binary."""
+        kind = _classify(entry)[0]
+        if kind == UNKNOWN and looks_binary(data[:SNIFF_BYTES]):
+            self._sniffed[entry.sha] = True
+            return None
+        text = data.decode("utf-8", errors="replace")
+        if self.blob_cache is not None:
+            self.blob_cache.put(entry.sha, text)
+        return text
 
     def _get_file_content(
         self,
         repo: Repository,
-        content: ContentFile,
+        entry: TreeEntry,
         branch: str,
-        line_patterns: Optional[List[str]],
-        keep_matching_lines: bool,
+        filters: FilterSet,
+        prefetched: Optional[Dict[str, dict]] = None,
+        shared: Optional[InputBlobs] = None,
     ) -> Optional[str]:
-        """Get and process content of a single file."""
+        """Get and process content of a single file.
+
+        ``prefetched`` maps blob SHAs to GraphQL blob results gathered for
+        a whole batch; files missing from it are requested individually.
+        """
         try:
-            # Check file size
-            if content.size > GITHUB_MAX_FILE_SIZE:
-                return f"File is too large to display (size: {content.size} bytes)"
-
-            # Handle binary files
-            file_ext = content.path.split(".")[-1].lower()
-            for type_name, extensions in BINARY_FILE_EXTENSIONS.items():
-                if file_ext in extensions:
-                    return f"[Binary {type_name} file: {content.path}]"
-
-            # Decode content
-            file_content = self._decode_content(content)
-
-            # Apply line filtering if patterns are provided
-            if line_patterns and file_content:
-                lines = file_content.split("\n")
-                lines = [
-                    line
-                    for line in lines
-                    if self._should_include_line(
-                        line, line_patterns, keep_matching_lines
+            skip_reason = self._skip_reason(entry)
+            if skip_reason is not None:
+                return skip_reason
+            if self._is_large(entry):
+                return _STREAMED
+
+            blob = (prefetched or {}).get(entry.sha)
+            if blob is not None:
+                if blob.get("isBinary"):
+                    return f"[Binary file: {entry.path}]"
+                if blob["byteSize"] > GITHUB_MAX_FILE_SIZE:
+                    return (
+                        "File is too large to display "
+                        f"(size: {blob['byteSize']} bytes)"
                     )
-                ]
-                return "\n".join(lines)
 
-            return file_content
+            file_content = self._read_blob(repo, entry, blob, shared)
+            if file_content is None:
+                return self._skip_reason(entry)  # Binary, found on download
+            return filters.filter_text(file_content)
 
         except Exception as e:
-            return (
-                f"Error: Could not fetch content for {content.path}. {str(e)}"
+            return ErrorText(
+                f"Error: Could not fetch content for {entry.path}. {str(e)}"
             )
+        finally:
+            if shared is not None:
+                # Inputs waiting for a blob this one skipped fetch it
+                shared.release(entry.sha)
 
-    def _decode_content(self, content: ContentFile) -> str:
-        """Safely decode content from base64."""
-        try:
-            import base64
+    def _skip_reason(self, entry: TreeEntry) -> Optional[str]:
+        """Return a placeholder for files that are not downloaded at all."""
+        kind, category = _classify(entry)
+        if kind == LARGE and not LARGE_FILES_ENABLED:
+            return f"File is too large to display (size: {entry.size} bytes)"
+        if kind == BINARY:
+            return f"[Binary {category} file: {entry.path}]"
+        if kind == GENERATED:
+            return f"[Generated file: {entry.path}]"
+        if kind == UNKNOWN and self._sniffed.get(entry.sha):
+            return f"[Binary file: {entry.path}]"
+        return None
 
-            return base64.b64decode(content.content).decode(
-                "utf-8", errors="replace"
-            )
-        except Exception as e:
-            return f"Error decoding content: {str(e)}"
+    def _read_blob(
+        self,
+        repo: Repository,
+        entry: TreeEntry,
+        prefetched: Optional[dict] = None,
+        shared: Optional[InputBlobs] = None,
+    ) -> Optional[str]:
+        """Return the decoded text of a blob, from the cache when possible.
 
-    def _should_include_line(
-        self, line: str, patterns: List[str], keep_matching: bool
-    ) -> bool:
-        """Determine if a line should be included based on patterns."""
-        import re
+        None means the blob turned out to be binary. With ``shared``, a
+        blob another input of the stitch downloads is waited for, and a
+        blob this input downloads is handed over to the inputs waiting for
+        it.
+        """
+        if shared is not None and shared.waits_for(entry.sha):
+            text = shared.take(entry.sha)
+            if text is not None:
+                return text
+            if shared.cancelled:
+                raise RuntimeError("input cancelled")
+        text = self._load_blob(repo, entry, prefetched)
+        if shared is not None and text is not None:
+            shared.put(entry.sha, text)
+        return text
+
+    def _load_blob(
+        self,
+        repo: Repository,
+        entry: TreeEntry,
+        prefetched: Optional[dict] = None,
+    ) -> Optional[str]:
+        if self.blob_cache is not None:
+            cached = self.blob_cache.get(entry.sha)
+            if cached is not None:
+                tracing.count("repo", "blob_cache_hits")
+                return cached
+
+        if (
+            prefetched is not None
+            and prefetched["text"] is not None
+            and not prefetched["isTruncated"]
+        ):
+            tracing.count("repo", "graphql_blobs")
+            text = prefetched["text"]
+            if self.blob_cache is not None:
+                self.blob_cache.put(entry.sha, text)
+            return text
+
+        # Files of unknown type are sniffed here, before being cached
+        tracing.count("repo", "rest_blobs")
+        blob = repo.get_git_blob(entry.sha)
+        return self._keep_blob(
+            entry, self._decode_content(blob.content, blob.encoding)
+        )
+
+    def _decode_content(
+        self, content: str, encoding: str = "base64"
+    ) -> bytes:
+        """Decode blob content from base64."""
+        import base64
+
+        if encoding != "base64":
+            return content.encode("utf-8")
+        return base64.b64decode(content)
+
+
+def _classify(entry: TreeEntry) -> Tuple[str, Optional[str]]:
+    """Classify an entry; a file named by the input is never generated."""
+    return classify_path(
+        entry.path,
+        entry.size,
+        skip_generated=SKIP_GENERATED_FILES and not entry.named,
+    )
+
+
+def _mark_named(entries: List[TreeEntry], path: str) -> List[TreeEntry]:
+    """Mark the entry of a file input, so it is read even if generated.
+
+    Generated files are only skipped when a directory, repository or
+    regex search is expanded, never when the user asked for the file.
+    """
+    path = path.strip("/")
+    return [
+        replace(entry, named=True) if path and entry.path == path else entry
+        for entry in entries
+    ]
+
+
+def _ordered(
+    entries: List[TreeEntry],
+    filters: FilterSet,
+    budget: Optional[OutputBudget],
+) -> List[TreeEntry]:
+    """Entries passing the path filter, in path or budget priority order."""
+    entries = [entry for entry in entries if filters.include_path(entry.path)]
+    if budget is None:
+        return sorted(entries, key=lambda entry: entry.path)
+    return sorted(entries, key=lambda entry: budget.sort_key(entry.path))
+
+
+def _file_section(
+    entry: TreeEntry, content: str, budget: Optional[OutputBudget]
+) -> FileSection:
+    failed = is_error(content)
+    if budget is not None:
+        content = budget.cap_file(content)
+    return FileSection(
+        f"\n--- {entry.path} ---\n\n{content}\n", entry.path, failed
+    )
+
+
+def _section(entry: TreeEntry, blocks: Iterator[str]) -> Iterator[str]:
+    """Wrap the content blocks of a file in its section header.
 
-        matches = any(re.search(pattern, line) for pattern in patterns)
-        return matches == keep_matching
+    Nothing is yielded when every block is empty, like a file whose lines
+    were all filtered out.
+    """
+    header = f"\n--- {entry.path} ---\n\n"
+    for block in blocks:
+        if not block:
+            continue
+        if header:
+            yield FileSection(header, entry.path)
+            header = None
+        yield FileSection(block, entry.path, is_error(block))
+    if header is None:
+        yield FileSection("\n", entry.path)
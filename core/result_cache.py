@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+from . import tracing
+from .budget import is_error
+from .config import (
+    INPUT_TIMEOUT,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MAX_CHARS,
+    RESULT_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A result being computed, which identical requests wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.chunks = None  # Set when the result was stored
+
+
+class ResultCache:
+    """Process-wide memo of the output sections of whole inputs.
+
+    Keys name an input, the immutable version its source resolved to (a
+    commit SHA, a pull request head, an issue's update time) and the
+    filters, so a hit is replayed without fetching any content. Entries
+    expire after ``ttl`` seconds and the least recently used ones are
+    evicted beyond ``max_chars`` characters. An identical request arriving
+    while a result is being computed waits for it instead of fetching the
+    same content again.
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESULT_CACHE_TTL,
+        max_chars: int = RESULT_CACHE_MAX_CHARS,
+    ):
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires at, chunks, size)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._total_chars = 0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Iterator[str]]
+    ) -> Iterator[str]:
+        """Yield the cached chunks for ``key``, or compute and store them.
+
+        Chunks are passed on as ``compute`` produces them. The result is
+        only stored when it completes and no chunk is marked as an error
+        (see ``budget.is_error``), since failures may be transient.
+        """
+        with self._lock:
+            chunks = self._get(key)
+            flight = None
+            leader = False
+            if chunks is None:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    leader = True
+                    outcome = "misses"
+                else:
+                    outcome = "coalesced"
+            else:
+                outcome = "hits"
+            self._stats[outcome] += 1
+        tracing.count("result_cache", outcome)
+
+        if chunks is not None:
+            yield from chunks
+            return
+        if leader:
+            yield from self._compute(key, flight, compute)
+            return
+
+        logger.debug("Waiting for an identical request in flight")
+        flight.done.wait(INPUT_TIMEOUT)
+        if flight.chunks is not None:
+            yield from flight.chunks
+        else:
+            yield from compute()
+
+    def stats(self) -> dict:
+        """Hit, miss and coalesced request counts and the cache size."""
+        with self._lock:
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                chars=self._total_chars,
+            )
+
+    def _compute(
+        self,
+        key: Hashable,
+        flight: _Flight,
+        compute: Callable[[], Iterator[str]],
+    ) -> Iterator[str]:
+        chunks: Optional[List[str]] = []
+        size = 0
+        complete = False
+        results = compute()
+        try:
+            for chunk in results:
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > self.max_chars or is_error(chunk):
+                        chunks = None  # Too large or failed; not stored
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            complete = True
+        finally:
+            results.close()
+            with self._lock:
+                del self._flights[key]
+                if complete and chunks is not None:
+                    self._put(key, chunks, size)
+                    flight.chunks = chunks
+            flight.done.set()
+
+    def _get(self, key: Hashable) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, chunks, size = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._total_chars -= size
+            return None
+        self._entries.move_to_end(key)
+        return chunks
+
+    def _put(self, key: Hashable, chunks: List[str], size: int) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_chars -= previous[2]
+        self._entries[key] = (time.monotonic() + self.ttl, chunks, size)
+        self._total_chars += size
+        while self._total_chars > self.max_chars:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._total_chars -= evicted
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache, or None when it is disabled."""
+    global _default_cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
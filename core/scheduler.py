@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_MAX_WAIT,
+    SCHEDULER_MAX_CONCURRENCY,
+    SECONDARY_LIMIT_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitScheduler:
+    """Admission control for all requests made with one set of credentials.
+
+    It tracks ``X-RateLimit-Remaining``/``Reset`` per resource and holds new
+    requests while a limit is exhausted or a ``Retry-After`` window is open.
+    Concurrency adapts to secondary limits: it is halved whenever one is
+    hit and grows back by one slot after a run of successful requests.
+    """
+
+    def __init__(self, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._successes = 0
+        self._blocked_until = 0.0  # Retry-After / secondary limit window
+        self._limits = {}  # resource -> (remaining, reset epoch seconds)
+        # Metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.requests = 0
+        self.throttled = 0
+
+    def acquire(self, resource: str = "core") -> float:
+        """Block until a request may be sent; return the seconds waited."""
+        started = time.monotonic()
+        with self._condition:
+            if not self._can_send(resource):
+                self.queue_depth += 1
+                self.max_queue_depth = max(
+                    self.max_queue_depth, self.queue_depth
+                )
+                try:
+                    while not self._can_send(resource):
+                        delay = self._delay(resource)
+                        self._condition.wait(
+                            timeout=delay if delay > 0 else None
+                        )
+                finally:
+                    self.queue_depth -= 1
+            self._in_flight += 1
+            self.requests += 1
+            waited = time.monotonic() - started
+            self.total_wait += waited
+            return waited
+
+    def release(self, response: Optional[Response], resource: str = "core"):
+        """Record the outcome of a request and free its slot.
+
+        Returns the number of seconds to wait before retrying when the
+        response was rate limited, otherwise None.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            retry_after = None
+            if response is not None:
+                self._update_limits(response, resource)
+                retry_after = self._throttle_delay(response, resource)
+                if retry_after is None:
+                    self._on_success()
+            self._condition.notify_all()
+            return retry_after
+
+    def stats(self) -> dict:
+        """Snapshot of the scheduler state for display and tracing."""
+        with self._condition:
+            now = time.time()
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "limits": {
+                    resource: {
+                        "remaining": remaining,
+                        "reset_in": max(0, round(reset - now)),
+                    }
+                    for resource, (remaining, reset) in self._limits.items()
+                },
+            }
+
+    def _can_send(self, resource: str) -> bool:
+        return (
+            self._delay(resource) <= 0 and self._in_flight < self.concurrency
+        )
+
+    def _delay(self, resource: str) -> float:
+        now = time.time()
+        delay = self._blocked_until - time.monotonic()
+        remaining, reset = self._limits.get(resource, (None, 0))
+        if remaining == 0 and reset > now:
+            delay = max(delay, reset - now)
+        return delay
+
+    def _update_limits(self, response: Response, resource: str) -> None:
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", resource)
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        self._limits[resource] = (remaining, reset)
+
+    def _throttle_delay(
+        self, response: Response, resource: str
+    ) -> Optional[float]:
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        remaining, reset = self._limits.get(resource, (None, 0))
+        if retry_after is None and remaining == 0:
+            # Primary limit: wait for the window to reset
+            retry_after = max(reset - time.time(), 1)
+        elif retry_after is not None or _is_secondary_limit(response):
+            # Secondary limit: back off and lower concurrency
+            if retry_after is None:
+                retry_after = SECONDARY_LIMIT_BACKOFF
+            self.concurrency = max(1, self.concurrency // 2)
+            self._successes = 0
+            self._blocked_until = max(
+                self._blocked_until, time.monotonic() + retry_after
+            )
+        else:
+            return None  # A permission error, not a rate limit
+
+        self.throttled += 1
+        return retry_after
+
+    def _on_success(self) -> None:
+        self._successes += 1
+        if (
+            self.concurrency < self.max_concurrency
+            and self._successes >= self.concurrency * 4
+        ):
+            self.concurrency += 1
+            self._successes = 0
+
+
+class ScheduledHTTPAdapter(HTTPAdapter):
+    """Transport adapter sending every request through a rate-limit scheduler.
+
+    Rate-limited responses are not returned to the caller; the request is
+    queued again until the limit resets, up to ``RATE_LIMIT_MAX_WAIT``
+    seconds of waiting per request.
+    """
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        scheduler = get_scheduler(request.headers.get("Authorization"))
+        resource = _resource_for(request.url)
+        waited = 0.0
+        attempt = 0
+        while True:
+            waited += scheduler.acquire(resource)
+            response = None
+            try:
+                response = super().send(request, **kwargs)
+            finally:
+                retry_after = scheduler.release(response, resource)
+
+            attempt += 1
+            if (
+                retry_after is None
+                or attempt > RATE_LIMIT_MAX_RETRIES
+                or waited + retry_after > RATE_LIMIT_MAX_WAIT
+            ):
+                response.scheduler_wait = waited
+                return response
+            logger.info(
+                "Rate limited on %s; retrying %s in %.0fs",
+                resource,
+                request.url,
+                retry_after,
+            )
+            response.content  # Drain so the connection can be reused
+            response.close()
+
+
+def _resource_for(url: str) -> str:
+    path = urlparse(url).path
+    if path.endswith("/graphql"):
+        return "graphql"
+    if "/search/" in path:
+        return "search"
+    return "core"
+
+
+def _is_secondary_limit(response: Response) -> bool:
+    try:
+        return "secondary rate limit" in response.text.lower()
+    except Exception:
+        return False
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(authorization: Optional[str] = None) -> RateLimitScheduler:
+    """Return the shared scheduler for a set of credentials.
+
+    Rate limits apply per token, so requests are grouped by their
+    Authorization header (only a digest of it is kept).
+    """
+    key = hashlib.sha256((authorization or "").encode("utf-8")).hexdigest()
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = RateLimitScheduler()
+        return _schedulers[key]
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+from .config import INCREMENTAL_ENABLED, SNAPSHOT_DIR
+from .tree import TreeEntry
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """Manifests of previous stitches, keyed by repository, ref and path.
+
+    A snapshot records the commit a stitch resolved to and the path, size
+    and blob SHA of every file it listed. When the ref still points at
+    that commit the stored manifest is reused as is; otherwise the tree is
+    listed again and only blobs whose SHA changed miss the blob cache.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(
+        self, repo_name: str, ref: str, path: str
+    ) -> Optional[Tuple[str, List[TreeEntry]]]:
+        """Return ``(commit SHA, entries)`` of the last stitch, or None."""
+        try:
+            with open(self._path(repo_name, ref, path), encoding="utf-8") as f:
+                snapshot = json.load(f)
+            entries = [
+                TreeEntry(path=entry_path, type="blob", size=size, sha=sha)
+                for entry_path, size, sha in snapshot["entries"]
+            ]
+            return snapshot["commit"], entries
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put(
+        self,
+        repo_name: str,
+        ref: str,
+        path: str,
+        commit_sha: str,
+        entries: List[TreeEntry],
+    ) -> None:
+        """Record the manifest a stitch was made from."""
+        snapshot = {
+            "commit": commit_sha,
+            "entries": [
+                [entry.path, entry.size, entry.sha] for entry in entries
+            ],
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path(repo_name, ref, path))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _path(self, repo_name: str, ref: str, path: str) -> str:
+        key = "\n".join([repo_name, ref, path.strip("/")])
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_snapshot_store() -> Optional[SnapshotStore]:
+    """Return the process-wide snapshot store, or None when disabled."""
+    global _default_store
+    if not INCREMENTAL_ENABLED:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            try:
+                _default_store = SnapshotStore()
+            except OSError as e:
+                logger.warning("Incremental stitching disabled: %s", e)
+                return None
+        return _default_store
@@ -0,0 +1,140 @@
+import codecs
+from typing import Iterable, Iterator, Optional
+
+from .classify import looks_binary
+from .config import SNIFF_BYTES, STREAM_BLOCK_BYTES
+from .filters import FilterSet
+
+
+class BinaryContentError(ValueError):
+    """Raised when a streamed file turns out not to be text."""
+
+
+def stream_text(
+    chunks: Iterable[bytes],
+    filters: FilterSet,
+    max_bytes: Optional[int] = None,
+    max_lines: Optional[int] = None,
+    max_line_chars: int = STREAM_BLOCK_BYTES,
+) -> Iterator[str]:
+    """Decode and filter a file arriving in byte chunks, in constant memory.
+
+    UTF-8 is decoded incrementally and the line filter is applied line by
+    line, so the output equals ``filters.filter_text`` over the whole file.
+    Reading stops after ``max_bytes`` bytes or ``max_lines`` lines, and a
+    note saying so ends the output. When lines are filtered or counted,
+    lines longer than ``max_line_chars`` are cut there, so a file without
+    newlines (a minified file, a SQL dump) is not buffered whole. Raises
+    ``BinaryContentError`` before yielding anything when the first bytes
+    look binary.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    read_bytes = 0
+    read_lines = 0
+    truncated = False
+    pending = LineBuffer(max_line_chars)  # Line not finished yet
+    out = []  # Output waiting to fill a block
+    out_size = 0
+    first_kept = True
+    checked = False
+    by_line = filters.has_line_filter or max_lines is not None
+
+    def keep(line: str) -> Optional[str]:
+        nonlocal first_kept
+        if not filters.include_line(line):
+            return None
+        text = line if first_kept else "\n" + line
+        first_kept = False
+        return text
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if not checked:
+            checked = True
+            if looks_binary(chunk[:SNIFF_BYTES]):
+                raise BinaryContentError("content is binary")
+        if max_bytes is not None and read_bytes + len(chunk) > max_bytes:
+            chunk = chunk[: max_bytes - read_bytes]
+            truncated = True
+        read_bytes += len(chunk)
+        text = decoder.decode(chunk)
+
+        if not by_line:
+            out.append(text)
+            out_size += len(text)
+        else:
+            for line in pending.feed(text):
+                if max_lines is not None and read_lines >= max_lines:
+                    truncated = True
+                    break
+                read_lines += 1
+                kept = keep(line)
+                if kept is not None:
+                    out.append(kept)
+                    out_size += len(kept)
+        if out_size >= STREAM_BLOCK_BYTES:
+            yield "".join(out)
+            out, out_size = [], 0
+        if truncated:
+            break
+
+    if not truncated:
+        tail = decoder.decode(b"", final=True)
+        if not by_line:
+            out.append(tail)
+        elif max_lines is not None and read_lines >= max_lines and (
+            pending.size or tail
+        ):
+            truncated = True
+        else:
+            pending.add(tail)
+            kept = keep(pending.finish())
+            if kept is not None:
+                out.append(kept)
+    if truncated:
+        if max_lines is not None and read_lines >= max_lines:
+            out.append(f"\n[Truncated after {read_lines} lines]")
+        else:
+            out.append(f"\n[Truncated after {read_bytes} bytes]")
+    if out:
+        yield "".join(out)
+
+
+class LineBuffer:
+    """Splits text arriving in pieces into lines, in bounded memory.
+
+    Only each new piece is split, and the start of an unfinished line is
+    kept as a list joined once the line ends. A line longer than
+    ``max_chars`` is cut there and ends in a note saying so.
+    """
+
+    def __init__(self, max_chars: int = STREAM_BLOCK_BYTES):
+        self.max_chars = max_chars
+        self.size = 0  # Characters of the unfinished line, cut ones too
+        self._pieces = []
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Yield the lines ``text`` finishes, without their newlines."""
+        start = 0
+        end = text.find("\n")
+        while end != -1:
+            self.add(text[start:end])
+            yield self.finish()
+            start = end + 1
+            end = text.find("\n", start)
+        self.add(text[start:])
+
+    def add(self, piece: str) -> None:
+        room = self.max_chars - self.size
+        if room > 0 and piece:
+            self._pieces.append(piece[:room])
+        self.size += len(piece)
+
+    def finish(self) -> str:
+        """Return the unfinished line and start a new one."""
+        line = "".join(self._pieces)
+        if self.size > self.max_chars:
+            line += f" [Line cut after {self.max_chars} characters]"
+        self._pieces, self.size = [], 0
+        return line
@@ -0,0 +1,310 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from requests import PreparedRequest, Response
+
+from .config import TRACE_ENABLED, TRACE_MAX_SPANS
+
+# Path segments replaced by a placeholder to name a request's endpoint
+_ENDPOINT_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{repo}"),
+    (re.compile(r"/contents/.*$"), "/contents/{path}"),
+    (re.compile(r"/(commits|tarball|zipball)/.*$"), r"/\1/{ref}"),
+    (re.compile(r"/[0-9a-f]{40}(?=/|$)"), "/{sha}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{number}"),
+]
+
+_trace = contextvars.ContextVar("trace", default=None)
+_input = contextvars.ContextVar("trace_input", default=None)
+
+
+@dataclass
+class Span:
+    """One timed operation of a stitch.
+
+    ``start`` is in seconds since the stitch began. Request spans carry
+    ``endpoint``, ``status``, ``bytes`` and ``cache`` attributes and the
+    index of the input they were made for, if any.
+    """
+
+    kind: str  # "phase", "input" or "request"
+    name: str
+    start: float
+    duration: float = 0.0
+    attributes: dict = field(default_factory=dict)
+
+
+class Trace:
+    """Spans and counters recorded while one stitch runs.
+
+    Spans past ``max_spans`` are not kept, but they still count towards
+    the per-endpoint and per-processor totals of ``summary``.
+    """
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.max_spans = max_spans
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self._origin = time.monotonic()
+        self._endpoints: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._finished_at = None
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes) -> Iterator[dict]:
+        """Time the body of a ``with`` block.
+
+        The attributes dict is yielded, so the block can add to it.
+        """
+        started = time.monotonic()
+        try:
+            yield attributes
+        finally:
+            self.record(kind, name, started, **attributes)
+
+    def record(self, kind: str, name: str, started: float, **attributes):
+        """Record a span that began at ``started`` (``time.monotonic``)."""
+        now = time.monotonic()
+        span = Span(
+            kind=kind,
+            name=name,
+            start=round(started - self._origin, 6),
+            duration=round(now - started, 6),
+            attributes=attributes,
+        )
+        with self._lock:
+            if kind == "request":
+                self._add_request(span)
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def count(self, group: str, name: str, amount: int = 1) -> None:
+        with self._lock:
+            counters = self.counters.setdefault(group, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    def finish(self) -> None:
+        self._finished_at = time.monotonic()
+
+    def summary(self) -> dict:
+        """Where the time of the stitch went, in totals.
+
+        Requests are totalled per endpoint; inputs per processor type,
+        together with the counters that processor recorded.
+        """
+        end = self._finished_at or time.monotonic()
+        with self._lock:
+            endpoints = {
+                endpoint: dict(totals)
+                for endpoint, totals in self._endpoints.items()
+            }
+            processors = {}
+            for span in self.spans:
+                if span.kind != "input":
+                    continue
+                totals = processors.setdefault(
+                    span.attributes.get("type"),
+                    {"inputs": 0, "seconds": 0.0, "errors": 0},
+                )
+                totals["inputs"] += 1
+                totals["seconds"] += span.duration
+                totals["errors"] += bool(span.attributes.get("error"))
+            for group, counters in self.counters.items():
+                processors.setdefault(group, {}).update(counters)
+            phases = {
+                span.name: span.duration
+                for span in self.spans
+                if span.kind == "phase"
+            }
+        requests = {
+            "count": sum(t["count"] for t in endpoints.values()),
+            "bytes": sum(t["bytes"] for t in endpoints.values()),
+            "seconds": sum(t["seconds"] for t in endpoints.values()),
+            "cache_hits": sum(t["cache_hits"] for t in endpoints.values()),
+            "errors": sum(t["errors"] for t in endpoints.values()),
+        }
+        for totals in list(endpoints.values()) + list(processors.values()):
+            if "seconds" in totals:
+                totals["seconds"] = round(totals["seconds"], 6)
+        requests["seconds"] = round(requests["seconds"], 6)
+        return {
+            "seconds": round(end - self._origin, 6),
+            "phases": phases,
+            "requests": requests,
+            "endpoints": endpoints,
+            "processors": processors,
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [asdict(span) for span in self.spans]
+        return {
+            "started_at": self.started_at,
+            "summary": self.summary(),
+            "spans": spans,
+            "dropped_spans": self.dropped_spans,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def _add_request(self, span: Span) -> None:
+        attributes = span.attributes
+        totals = self._endpoints.setdefault(
+            attributes["endpoint"],
+            {
+                "count": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+                "cache_hits": 0,
+                "errors": 0,
+            },
+        )
+        totals["count"] += 1
+        totals["bytes"] += attributes.get("bytes") or 0
+        totals["seconds"] += span.duration
+        totals["cache_hits"] += attributes.get("cache") == "hit"
+        status = attributes.get("status")
+        totals["errors"] += status is None or status >= 400
+
+
+def new_trace() -> Optional[Trace]:
+    """Return a trace for one stitch, or None when tracing is disabled."""
+    return Trace() if TRACE_ENABLED else None
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[None]:
+    """Record what runs in the ``with`` block into ``trace``.
+
+    Workers the block starts record into it too when their work is
+    wrapped with ``bind``.
+    """
+    token = _trace.set(trace)
+    try:
+        yield
+    finally:
+        _reset(_trace, token)
+
+
+@contextmanager
+def input_span(index: int, name: str, input_type: str) -> Iterator[dict]:
+    """Time one input; requests made in the block are tagged with it."""
+    trace = _trace.get()
+    token = _input.set(index)
+    try:
+        if trace is None:
+            yield {}
+        else:
+            with trace.span(
+                "input", name, index=index, type=input_type
+            ) as attributes:
+                yield attributes
+    finally:
+        _reset(_input, token)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a step of the stitch that is not part of any one input."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span("phase", name):
+        yield
+
+
+def count(group: str, name: str, amount: int = 1) -> None:
+    """Add to a counter of the current trace, e.g. files of a processor."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.count(group, name, amount)
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap ``fn`` to run in a copy of the current context.
+
+    Work handed to a thread pool keeps recording into the stitch's trace
+    and input this way. Each call of ``bind`` makes its own copy, as a
+    context can only be entered by one thread at a time.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def record_request(
+    request: PreparedRequest,
+    response: Optional[Response],
+    started: float,
+    stream: bool = False,
+    error: Optional[Exception] = None,
+) -> None:
+    """Record an HTTP request into the current trace, if any.
+
+    The duration is the time to the response headers. ``bytes`` is the
+    body size when it is known: 0 for a response served from the HTTP
+    cache and None for a stream of unknown length.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    attributes = {
+        "endpoint": endpoint_name(request.method, request.url),
+        "input": _input.get(),
+        "status": None,
+        "bytes": None,
+        "cache": None,
+    }
+    if response is not None:
+        attributes["status"] = response.status_code
+        from_cache = getattr(response, "from_cache", None)
+        if from_cache is not None:
+            attributes["cache"] = "hit" if from_cache else "miss"
+        attributes["bytes"] = _body_size(response, stream)
+        attributes["wait"] = round(getattr(response, "scheduler_wait", 0), 6)
+    if error is not None:
+        attributes["error"] = str(error)
+    trace.record("request", request.url, started, **attributes)
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Name a request by its method and path template."""
+    path = urlparse(url).path
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return f"{method} {path}"
+
+
+def _reset(var: contextvars.ContextVar, token: contextvars.Token) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        pass  # A generator closed from another context; nothing to undo
+
+
+def _body_size(response: Response, stream: bool) -> Optional[int]:
+    if getattr(response, "from_cache", False):
+        return 0
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length)
+    if stream:
+        return None
+    # The body is read right after the adapter returns anyway
+    return len(response.content)
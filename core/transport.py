@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+
+import requests
+from github import Auth, Github
+from github.Requester import (
+    HTTPRequestsConnectionClass,
+    HTTPSRequestsConnectionClass,
+    Requester,
+)
+from urllib3.util.retry import Retry
+
+from .config import REQUEST_RETRIES, TRANSPORT_POOL_SIZE
+from .http_cache import CachingHTTPAdapter, get_default_http_cache
+from .scheduler import ScheduledHTTPAdapter
+from .tracing import current_trace, record_request
+
+logger = logging.getLogger(__name__)
+
+
+class GitHubHTTPAdapter(CachingHTTPAdapter, ScheduledHTTPAdapter):
+    """Adapter for all GitHub traffic: ETag cache over rate-limit scheduling.
+
+    Requests made while a stitch is traced are recorded as spans of it.
+    """
+
+    def send(self, request, stream=False, **kwargs):
+        if current_trace() is None:
+            return super().send(request, stream=stream, **kwargs)
+        started = time.monotonic()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except Exception as e:
+            record_request(request, None, started, stream, error=e)
+            raise
+        record_request(request, response, started, stream)
+        return response
+
+
+def _connection_retry() -> Retry:
+    # Only connection-level failures are retried here; rate limits are
+    # handled by the scheduler so that throttling stays visible
+    return Retry(
+        total=REQUEST_RETRIES,
+        status=0,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+
+
+class _ThreadSafeRequestMixin:
+    """Keep the pending request per thread instead of on the connection.
+
+    PyGithub shares one connection object per client and stores the verb,
+    URL and headers on it between ``request()`` and ``getresponse()``, so
+    concurrent callers would otherwise overwrite each other's requests.
+    Requests are sent through the session of the owning ``Transport``.
+    """
+
+    transport = None  # Set on the per-transport subclasses
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+        # Drop PyGithub's own session for the shared, cached, scheduled one
+        self.session.close()
+        self.session = self.transport.session
+        self.adapter = self.transport.adapter
+
+    def request(self, verb, url, input, headers, stream=False):
+        self._local.args = (verb, url, input, headers, stream)
+
+    def close(self):
+        pass  # The session belongs to the transport
+
+    @property
+    def verb(self):
+        return self._local.args[0]
+
+    @property
+    def url(self):
+        return self._local.args[1]
+
+    @property
+    def input(self):
+        return self._local.args[2]
+
+    @property
+    def headers(self):
+        return self._local.args[3]
+
+    @property
+    def stream(self):
+        return self._local.args[4]
+
+
+class ThreadSafeHTTPSConnection(
+    _ThreadSafeRequestMixin, HTTPSRequestsConnectionClass
+):
+    pass
+
+
+class ThreadSafeHTTPConnection(
+    _ThreadSafeRequestMixin, HTTPRequestsConnectionClass
+):
+    pass
+
+
+class _PerThreadClient:
+    """Stand-in for a client whose connection class cannot be replaced.
+
+    Each thread gets a PyGithub client of its own, so concurrent requests
+    never share a connection object. These clients bypass the transport's
+    session, cache and scheduler.
+    """
+
+    def __init__(self, make_client):
+        self._make_client = make_client
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._make_client()
+        return getattr(client, name)
+
+
+class Transport:
+    """One keep-alive connection pool for all GitHub traffic.
+
+    PyGithub clients made with ``create_client`` and raw requests (diffs,
+    tarballs) share one ``requests.Session``: the same connections, ETag
+    cache and rate-limit scheduler. The pool keeps ``pool_size``
+    connections per host, enough for every request the scheduler lets
+    through at once, so no connection is opened only to be thrown away.
+    """
+
+    def __init__(self, pool_size: int = TRANSPORT_POOL_SIZE):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        # Credentials come with each request; keep .netrc from replacing them
+        self.session.auth = Requester.noopAuth
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.adapter = GitHubHTTPAdapter(
+            get_default_http_cache(),
+            max_retries=_connection_retry(),
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._connection_classes = {
+            "https": type(
+                "TransportHTTPSConnection",
+                (ThreadSafeHTTPSConnection,),
+                {"transport": self},
+            ),
+            "http": type(
+                "TransportHTTPConnection",
+                (ThreadSafeHTTPConnection,),
+                {"transport": self},
+            ),
+        }
+
+    def create_client(self, token: str, **kwargs) -> Github:
+        """Create a PyGithub client that can be shared between worker threads.
+
+        PyGithub's default client-side spacing of requests is disabled; it
+        would serialize concurrent fetches and is applied without any
+        locking. Lists are paged 100 items at a time, the API maximum.
+
+        The client's connection class is a private attribute of PyGithub's
+        ``Requester``; if a PyGithub release drops it, every thread gets a
+        client of its own instead.
+        """
+        kwargs.setdefault("seconds_between_requests", None)
+        kwargs.setdefault("seconds_between_writes", None)
+        kwargs.setdefault("retry", _connection_retry())
+        kwargs.setdefault("per_page", 100)
+
+        def make_client() -> Github:
+            return Github(
+                auth=Auth.Token(token), pool_size=self.pool_size, **kwargs
+            )
+
+        github = make_client()
+        requester = github.requester
+        if not hasattr(requester, "_Requester__connectionClass"):
+            logger.warning(
+                "Unsupported PyGithub version; using a client per thread"
+            )
+            return _PerThreadClient(make_client)
+        if requester.base_url.startswith("https://"):
+            connection_class = self._connection_classes["https"]
+        else:
+            connection_class = self._connection_classes["http"]
+        requester._Requester__connectionClass = connection_class
+        return github
+
+
+def auth_headers(github: Github) -> dict:
+    """Authorization header of a client, for raw requests made outside it."""
+    headers = {}
+    auth = github.requester.auth
+    if auth is not None:
+        auth.authentication(headers)
+    return headers
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    """Return the process-wide transport, so connections outlive a stitch."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from github.GitTreeElement import GitTreeElement
+from github.Repository import Repository
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    """A single entry of a repository tree manifest."""
+
+    path: str
+    type: str  # "blob", "tree" or "commit" (submodule)
+    size: int
+    sha: str
+    named: bool = False  # The file an input names itself, not a listing
+
+
+def resolve_ref(repo: Repository, ref: str) -> Tuple[str, str]:
+    """Resolve a branch, tag or SHA to its (commit SHA, root tree SHA)."""
+    commit = repo.get_commit(ref)
+    return commit.sha, commit.commit.tree.sha
+
+
+def list_tree(
+    repo: Repository, tree_sha: str, prefix: str = ""
+) -> List[TreeEntry]:
+    """List every entry below a tree using the recursive Git Trees API.
+
+    A single ``recursive=1`` request returns the whole manifest. When GitHub
+    reports the listing as truncated, the tree is paged one level at a time
+    and each sub-tree is listed on its own (recursively where possible).
+    """
+    tree = repo.get_git_tree(tree_sha, recursive=True)
+    if not tree.truncated:
+        return [_make_entry(element, prefix) for element in tree.tree]
+
+    entries = []
+    for element in repo.get_git_tree(tree_sha).tree:
+        entry = _make_entry(element, prefix)
+        entries.append(entry)
+        if entry.type == "tree":
+            entries.extend(list_tree(repo, entry.sha, entry.path + "/"))
+    return entries
+
+
+def get_manifest(
+    repo: Repository, ref: str, path: str = ""
+) -> Tuple[str, List[TreeEntry]]:
+    """Return the resolved commit SHA and the blobs at or below ``path``."""
+    commit_sha, tree_sha = resolve_ref(repo, ref)
+    return commit_sha, list_blobs(repo, tree_sha, path)
+
+
+def list_blobs(
+    repo: Repository, tree_sha: str, path: str = ""
+) -> List[TreeEntry]:
+    """List the blobs of a tree at or below ``path``.
+
+    Only the sub-tree at ``path`` is listed, so a single file or a small
+    directory of a large repository costs a few requests rather than a
+    listing of the whole repository.
+    """
+    path = path.strip("/")
+    prefix = ""
+    if path:
+        top = find_entry(repo, tree_sha, path)
+        if top is None or top.type != "tree":
+            return [top] if top is not None and top.type == "blob" else []
+        tree_sha, prefix = top.sha, top.path + "/"
+    return [
+        entry
+        for entry in list_tree(repo, tree_sha, prefix)
+        if entry.type == "blob"
+    ]
+
+
+def find_entry(
+    repo: Repository, tree_sha: str, path: str
+) -> Optional[TreeEntry]:
+    """Return the entry at ``path`` below a tree, or None if there is none.
+
+    Each directory on the way is listed on its own, without recursion.
+    """
+    parts = path.strip("/").split("/")
+    found = None
+    for depth, name in enumerate(parts):
+        if found is not None:
+            if found.type != "tree":
+                return None
+            tree_sha = found.sha
+        prefix = "/".join(parts[:depth])
+        prefix = prefix + "/" if prefix else ""
+        found = next(
+            (
+                _make_entry(element, prefix)
+                for element in repo.get_git_tree(tree_sha).tree
+                if element.path == name
+            ),
+            None,
+        )
+        if found is None:
+            return None
+    return found
+
+
+def is_under(entry_path: str, path: str) -> bool:
+    return not path or entry_path == path or entry_path.startswith(path + "/")
+
+
+def _make_entry(element: GitTreeElement, prefix: str) -> TreeEntry:
+    return TreeEntry(
+        path=prefix + element.path,
+        type=element.type,
+        size=element.size or 0,
+        sha=element.sha,
+    )
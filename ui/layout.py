@@ -1,4 +1,6 @@
+import time
 import streamlit as st
+from core.config import DISPLAY_BLOCK_BYTES, DISPLAY_MAX_BYTES
 from .components import (
     github_input_area,
     file_pattern_input,
@@ -37,6 +39,123 @@ def render_ui():
     )
 
 
+def render_stitch_output(chunks, buffer, refresh_seconds=0.5):
+    """Render stitched chunks as they arrive and copy them into ``buffer``.
+
+    Output is shown in code blocks of up to ``DISPLAY_BLOCK_BYTES`` that are
+    refreshed while they fill. The preview stops after ``DISPLAY_MAX_BYTES``;
+    the buffer always receives the complete output for the download.
+    """
+    placeholder = st.empty()
+    block = []
+    block_size = 0
+    shown = 0
+    last_refresh = time.monotonic()
+
+    for chunk in chunks:
+        buffer.write(chunk)
+        if shown >= DISPLAY_MAX_BYTES:
+            continue
+
+        block.append(chunk)
+        block_size += len(chunk)
+        shown += len(chunk)
+        now = time.monotonic()
+        if block_size >= DISPLAY_BLOCK_BYTES:
+            placeholder.code("".join(block), language="text")
+            placeholder = st.empty()
+            block = []
+            block_size = 0
+            last_refresh = now
+        elif now - last_refresh >= refresh_seconds:
+            placeholder.code("".join(block), language="text")
+            last_refresh = now
+
+    if block:
+        placeholder.code("".join(block), language="text")
+    if shown >= DISPLAY_MAX_BYTES:
+        st.info(
+            "Preview truncated. Download the stitched content to see all "
+            f"{buffer.size:,} bytes."
+        )
+
+
+def render_trace(trace, slowest=10):
+    """Render a collapsible summary of where the time of a stitch went.
+
+    Shows the time of each phase, requests per endpoint, totals per
+    processor and the ``slowest`` requests, with the full trace as a JSON
+    download.
+    """
+    if trace is None:
+        return
+    summary = trace.summary()
+    requests = summary["requests"]
+    with st.expander("⏱️ Trace"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total time", f"{summary['seconds']:.2f}s")
+        col2.metric("Requests", requests["count"])
+        col3.metric("Downloaded", f"{requests['bytes']:,} B")
+        col4.metric("Cache hits", requests["cache_hits"])
+
+        if summary["phases"]:
+            st.markdown("**Phases**")
+            st.dataframe(
+                [
+                    {"phase": name, "seconds": seconds}
+                    for name, seconds in summary["phases"].items()
+                ],
+                hide_index=True,
+            )
+        if summary["endpoints"]:
+            st.markdown("**Requests by endpoint**")
+            st.dataframe(
+                [
+                    {"endpoint": endpoint, **totals}
+                    for endpoint, totals in sorted(
+                        summary["endpoints"].items(),
+                        key=lambda item: -item[1]["seconds"],
+                    )
+                ],
+                hide_index=True,
+            )
+        if summary["processors"]:
+            st.markdown("**Processors**")
+            st.dataframe(
+                [
+                    {"processor": name, **totals}
+                    for name, totals in summary["processors"].items()
+                ],
+                hide_index=True,
+            )
+        spans = sorted(
+            (span for span in trace.spans if span.kind == "request"),
+            key=lambda span: -span.duration,
+        )[:slowest]
+        if spans:
+            st.markdown("**Slowest requests**")
+            st.dataframe(
+                [
+                    {
+                        "url": span.name,
+                        "seconds": span.duration,
+                        "status": span.attributes.get("status"),
+                        "bytes": span.attributes.get("bytes"),
+                        "cache": span.attributes.get("cache"),
+                    }
+                    for span in spans
+                ],
+                hide_index=True,
+            )
+        st.download_button(
+            "Download trace (JSON)",
+            trace.to_json(),
+            "stitch_trace.json",
+            mime="application/json",
+            on_click="ignore",
+        )
+
+
 def render_sidebar():
     """Render the sidebar with information and help."""
     st.sidebar.markdown(